@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'core',
@@ -84,17 +85,143 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
+# Workers keep their connection open for DB_CONN_MAX_AGE seconds (0 closes
+# it after every request, -1 keeps it for good), and check a kept one
+# before its first use in a request (see core.backends.postgresql). Every
+# uwsgi thread holds at most one connection, and so does every image
+# thread while it processes an image, so UWSGI_WORKERS times the sum of
+# UWSGI_THREADS (scripts/run.sh) and RECIPE_IMAGE_WORKERS, plus one for
+# process_stuck_images, bounds the connections of an app container. Set
+# DB_PGBOUNCER when DB_HOST is pgbouncer in transaction pooling mode,
+# which can't keep server-side cursors open.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_PGBOUNCER = bool(int(os.environ.get('DB_PGBOUNCER', 0)))
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE if DB_CONN_MAX_AGE >= 0 else None,
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))
+        ),
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
     }
 }
 
+# Read replicas, as comma separated hosts, or name@host for a database
+# other than DB_NAME. Safe list and retrieve requests of the recipe APIs
+# read from one of them (see core.routers), unless the user changed their
+# data in the last DB_REPLICA_PIN_SECONDS, so they read their own writes,
+# or the replica is more than DB_REPLICA_MAX_LAG seconds behind. The lag
+# is checked every DB_REPLICA_LAG_CHECK_INTERVAL seconds per process.
+# Pinning relies on the user cache versions, so needs a shared cache when
+# running several workers.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1
+):
+    name, _, host = replica.strip().rpartition('@')
+    DATABASE_REPLICAS.append(f'replica_{number}')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'NAME': name or DATABASES['default']['NAME'],
+        # Tests read the test database through the replicas.
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+DB_REPLICA_PIN_SECONDS = float(os.environ.get('DB_REPLICA_PIN_SECONDS', 5))
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 2))
+DB_REPLICA_LAG_CHECK_INTERVAL = float(
+    os.environ.get('DB_REPLICA_LAG_CHECK_INTERVAL', 5)
+)
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Local memory is per process; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared backend (e.g. django.core.cache.backends.memcached.PyMemcacheCache
+# and memcached:11211, as docker-compose-deploy.yml does) when running
+# several workers so invalidations are seen by all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+CACHE_SHARED = CACHES['default']['BACKEND'] not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Recipe, tag and ingredient lists, suggestions and the users' cache
+# versions (see recipe.cache) are cached in RECIPE_LIST_CACHE_ALIAS. It
+# must be shared by every worker, or a change would only invalidate the
+# cache of the worker making it, so it is only set by default with a
+# shared CACHE_BACKEND. Setting it explicitly, or empty to cache nothing,
+# overrides that, e.g. for a single process.
+RECIPE_LIST_CACHE_ALIAS = os.environ.get(
+    'RECIPE_LIST_CACHE_ALIAS', 'default' if CACHE_SHARED else ''
+) or None
+RECIPE_LIST_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_LIST_CACHE_TIMEOUT', 300)
+)
+
+# Token to user resolutions cached by core.authentication. By default each
+# process keeps up to TOKEN_AUTH_CACHE_MAX_SIZE of them, and so only notices
+# changes made through other workers after TOKEN_AUTH_CACHE_TIMEOUT. With a
+# shared CACHE_BACKEND they are kept in TOKEN_AUTH_CACHE_ALIAS instead, where
+# changes to a user evict their tokens for every worker; set it empty to
+# keep the cache of each process anyway.
+TOKEN_AUTH_CACHE_ALIAS = os.environ.get(
+    'TOKEN_AUTH_CACHE_ALIAS', 'default' if CACHE_SHARED else ''
+) or None
+TOKEN_AUTH_CACHE_TIMEOUT = int(os.environ.get('TOKEN_AUTH_CACHE_TIMEOUT', 60))
+TOKEN_AUTH_CACHE_MAX_SIZE = int(
+    os.environ.get('TOKEN_AUTH_CACHE_MAX_SIZE', 10000)
+)
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/3.2/topics/auth/passwords/
+# PASSWORD_HASHER picks the preferred hasher (pbkdf2 or argon2); the other
+# hashers are only kept to verify, and then upgrade, existing hashes.
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'core.hashers.TunablePBKDF2PasswordHasher',
+    'argon2': 'core.hashers.TunableArgon2PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS.pop(PASSWORD_HASHER),
+    *_PASSWORD_HASHERS.values(),
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 260000)
+)
+# Argon2 defaults to OWASP's 19 MiB, 2 passes and 1 lane, as every login
+# of every worker allocates the memory cost (in KiB). Raise the costs,
+# e.g. to 65536/3/2, only where the containers have memory to spare.
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 19456)
+)
+PASSWORD_ARGON2_PARALLELISM = int(
+    os.environ.get('PASSWORD_ARGON2_PARALLELISM', 1)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -138,6 +265,38 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Uploaded recipe images are resized on a thread pool of this many workers
+# per process; 0 processes them in the request once it has committed. The
+# pool's queue is lost with the process, see process_stuck_images.
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+# Limits on uploaded recipe images, checked from the image header before
+# anything decodes it.
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(
+    os.environ.get('RECIPE_IMAGE_MAX_UPLOAD_SIZE', 10 * 2 ** 20)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 40_000_000)
+)
+RECIPE_IMAGE_FORMATS = ['JPEG', 'PNG', 'WEBP', 'GIF']
+# Longest edge in pixels of each generated image variant.
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': 200,
+    'medium': 800,
+    'large': 1600,
+}
+
+# Postgres text search configuration of the recipe search.
+RECIPE_SEARCH_CONFIG = os.environ.get('RECIPE_SEARCH_CONFIG', 'english')
+
+# Suggestions of tag and ingredient names: how many are returned by
+# default and at most, and for how many seconds they are cached. Cached
+# suggestions are also dropped when the user changes their tags.
+RECIPE_AUTOCOMPLETE_LIMIT = int(os.environ.get('RECIPE_AUTOCOMPLETE_LIMIT', 10))
+RECIPE_AUTOCOMPLETE_MAX_LIMIT = 50
+RECIPE_AUTOCOMPLETE_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_AUTOCOMPLETE_CACHE_TIMEOUT', 30)
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -147,8 +306,24 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # JSON through orjson, and MessagePack for clients that accept it.
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# Keyset pagination for the recipe APIs (opt-in via `cursor`/`page_size`).
+RECIPE_PAGE_SIZE = int(os.environ.get('RECIPE_PAGE_SIZE', 100))
+RECIPE_MAX_PAGE_SIZE = int(os.environ.get('RECIPE_MAX_PAGE_SIZE', 1000))
+
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True
 }
\ No newline at end of file
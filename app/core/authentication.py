@@ -0,0 +1,164 @@
+"""
+Authentication classes for the APIs.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def token_entry(token):
+    """Return what is cached for a token: its user's id and is_active."""
+    return token.user_id, token.user.is_active
+
+
+class LocalTokenCache:
+    """Bounded, in-process LRU cache of tokens with a time to live."""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached entry for key, or None."""
+        with self._lock:
+            cached = self._tokens.get(key)
+            if cached is None:
+                return None
+            entry, expires = cached
+            if expires <= time.monotonic():
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+
+        return entry
+
+    def set(self, token):
+        """Cache a token, evicting the least recently used ones."""
+        with self._lock:
+            self._tokens[token.key] = (
+                token_entry(token),
+                time.monotonic() + self.timeout,
+            )
+            self._tokens.move_to_end(token.key)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+    def delete(self, key):
+        """Remove the token for key."""
+        with self._lock:
+            self._tokens.pop(key, None)
+
+    def delete_user(self, user_id):
+        """Remove every token of a user."""
+        with self._lock:
+            for key, ((cached_id, active), expires) in list(
+                self._tokens.items()
+            ):
+                if cached_id == user_id:
+                    del self._tokens[key]
+
+    def clear(self):
+        """Remove every token."""
+        with self._lock:
+            self._tokens.clear()
+
+
+class SharedTokenCache:
+    """Token cache stored in a Django cache shared between processes."""
+
+    def __init__(self, alias, timeout):
+        self.alias = alias
+        self.timeout = timeout
+
+    def _key(self, key):
+        return f'token-auth:{key}'
+
+    def get(self, key):
+        """Return the cached entry for key, or None."""
+        entry = caches[self.alias].get(self._key(key))
+
+        return None if entry is None else tuple(entry)
+
+    def set(self, token):
+        """Cache a token."""
+        caches[self.alias].set(
+            self._key(token.key), token_entry(token), self.timeout
+        )
+
+    def delete(self, key):
+        """Remove the token for key."""
+        caches[self.alias].delete(self._key(key))
+
+    def delete_user(self, user_id):
+        """Remove every token of a user."""
+        keys = Token.objects.filter(user_id=user_id).values_list(
+            'key', flat=True
+        )
+        caches[self.alias].delete_many([self._key(key) for key in keys])
+
+    def clear(self):
+        """Remove every token of every user."""
+        keys = Token.objects.values_list('key', flat=True)
+        caches[self.alias].delete_many([self._key(key) for key in keys])
+
+
+def get_token_cache():
+    """Return the token cache configured in the settings."""
+    if settings.TOKEN_AUTH_CACHE_ALIAS:
+        return SharedTokenCache(
+            settings.TOKEN_AUTH_CACHE_ALIAS,
+            settings.TOKEN_AUTH_CACHE_TIMEOUT,
+        )
+
+    return LocalTokenCache(
+        settings.TOKEN_AUTH_CACHE_MAX_SIZE,
+        settings.TOKEN_AUTH_CACHE_TIMEOUT,
+    )
+
+
+token_cache = get_token_cache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that caches token to user resolutions.
+
+    Only the id and is_active of the token's user are cached, never the
+    user itself with its password hash. The user authenticated from the
+    cache has its other fields deferred, loaded if ever read; views
+    changing the user load it afresh.
+
+    Entries are dropped when the token is deleted or its user is saved
+    (see core.signals). With the in-process cache, the default unless
+    TOKEN_AUTH_CACHE_ALIAS is shared, other workers only notice after
+    TOKEN_AUTH_CACHE_TIMEOUT seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        """Return the user and token for key, from the cache if present."""
+        entry = token_cache.get(key)
+        if entry is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(token)
+            return user, token
+
+        user_id, is_active = entry
+        user_model = get_user_model()
+        user = user_model.from_db(
+            None, [user_model._meta.pk.attname, 'is_active'],
+            [user_id, is_active],
+        )
+        token = self.get_model().from_db(
+            None, ['key', 'user_id'], [key, user_id],
+        )
+        token.user = user
+
+        return user, token
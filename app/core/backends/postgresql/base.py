@@ -0,0 +1,51 @@
+"""
+PostgreSQL backend with health checks of persistent connections.
+
+With CONN_MAX_AGE set, a worker keeps its connection between requests,
+and a connection the server or a proxy dropped in the meantime would
+fail the next request. With CONN_HEALTH_CHECKS set as well, a kept
+connection is checked with a cheap query before its first use in each
+request, and replaced if it no longer works, as Django 4.1 does.
+Requests that don't touch the database aren't slowed down by the check.
+"""
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL connections, checked before they're reused."""
+
+    health_check_done = False
+
+    def connect(self):
+        # A new connection works, there's nothing to check as it's set up.
+        self.health_check_done = True
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        # Reading the autocommit state here isn't a use of the connection.
+        self.health_check_done = True
+        super().close_if_unusable_or_obsolete()
+        # Run at the start and end of every request, so the connection is
+        # checked again on its first use by the next one.
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        """Close the connection if it's reused and no longer works."""
+        if (
+            self.connection is None or
+            self.health_check_done or
+            not self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            return
+
+        self.health_check_done = True
+        if not self.is_usable():
+            self.close()
+
+    @async_unsafe
+    def ensure_connection(self):
+        # A transaction can't carry on on a new connection.
+        if not self.in_atomic_block:
+            self.close_if_health_check_failed()
+        super().ensure_connection()
@@ -0,0 +1,134 @@
+"""
+Django command to benchmark request latency with persistent connections.
+"""
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
+
+EMAIL = 'benchmark-connections@example.com'
+
+
+class Command(BaseCommand):
+    """Django command to time requests with and without kept connections."""
+    help = (
+        'Send concurrent requests through the WSGI handler, with each '
+        'CONN_MAX_AGE given, and report the latency percentiles and the '
+        'number of database connections opened.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Number of requests sent to each endpoint.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Number of threads sending requests at once.',
+        )
+        parser.add_argument(
+            '--max-ages',
+            type=int,
+            nargs='+',
+            default=[0, 60],
+            help='CONN_MAX_AGE values to compare.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for benchmarking database connections"""
+        user, _ = get_user_model().objects.get_or_create(email=EMAIL)
+        try:
+            token, _ = Token.objects.get_or_create(user=user)
+            recipe = Recipe.objects.create(
+                user=user, title='Benchmark', time_minutes=1, price='1.00',
+            )
+            endpoints = (
+                # Doesn't touch the database, for comparison.
+                ('health check', reverse('health-check')),
+                ('recipe detail', reverse(
+                    'recipe:recipe-detail', args=[recipe.pk],
+                )),
+            )
+            headers = {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+            settings_dict = connections.databases['default']
+            max_age = settings_dict['CONN_MAX_AGE']
+            try:
+                for age in options['max_ages']:
+                    settings_dict['CONN_MAX_AGE'] = age
+                    self.stdout.write(
+                        f'CONN_MAX_AGE={age}, CONN_HEALTH_CHECKS='
+                        f'{settings_dict.get("CONN_HEALTH_CHECKS", False)}'
+                    )
+                    for name, path in endpoints:
+                        self._benchmark(name, path, headers, options)
+            finally:
+                settings_dict['CONN_MAX_AGE'] = max_age
+        finally:
+            connections.close_all()
+            get_user_model().objects.filter(pk=user.pk).delete()
+
+    def _benchmark(self, name, path, headers, options):
+        """Send the requests to path and report their latencies."""
+        connections.close_all()
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        timings = []
+        opened = []
+        lock = threading.Lock()
+        per_thread = options['requests'] // options['concurrency']
+
+        def count_connection(sender, connection, **kwargs):
+            with lock:
+                opened.append(connection.alias)
+
+        def send_requests():
+            for _ in range(per_thread):
+                environ = factory.get(path, **headers).environ
+                start = time.perf_counter()
+                response = handler(environ, lambda status, headers: None)
+                b''.join(response)
+                # Closing the response ends the request, like a server.
+                response.close()
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    timings.append(elapsed)
+            connections.close_all()
+
+        connection_created.connect(count_connection)
+        threads = [
+            threading.Thread(target=send_requests)
+            for _ in range(options['concurrency'])
+        ]
+        start = time.perf_counter()
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        seconds = time.perf_counter() - start
+        connection_created.disconnect(count_connection)
+
+        timings.sort()
+        p99 = timings[max(0, int(len(timings) * 0.99) - 1)]
+        self.stdout.write(
+            f'  {name:<14} p50 {statistics.median(timings):6.2f} ms'
+            f'  p99 {p99:6.2f} ms'
+            f'  {len(timings) / seconds:7.0f} req/s'
+            f'  {len(opened):5} connections'
+        )
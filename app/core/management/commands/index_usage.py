@@ -0,0 +1,47 @@
+"""
+Django command to report how often the app's indexes are used.
+"""
+from django.core.management import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    """Django command to report index usage from pg_stat_user_indexes."""
+    help = 'Report index scans for the app tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table-prefix',
+            default='core_',
+            help='Only report indexes on tables starting with this prefix.',
+        )
+        parser.add_argument(
+            '--unused',
+            action='store_true',
+            help='Only report indexes that have never been scanned.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for reporting index usage"""
+        sql = (
+            'SELECT relname, indexrelname, idx_scan, idx_tup_read, '
+            'pg_size_pretty(pg_relation_size(indexrelid)) '
+            'FROM pg_stat_user_indexes WHERE relname LIKE %s'
+        )
+        if options['unused']:
+            sql += ' AND idx_scan = 0'
+        sql += ' ORDER BY relname, idx_scan DESC, indexrelname'
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [options['table_prefix'] + '%'])
+            rows = cursor.fetchall()
+
+        header = ('table', 'index', 'scans', 'tuples read', 'size')
+        widths = [
+            max(len(str(row[i])) for row in rows + [header])
+            for i in range(len(header))
+        ]
+        for row in [header] + rows:
+            self.stdout.write('  '.join(
+                str(value).ljust(width) for value, width in zip(row, widths)
+            ).rstrip())
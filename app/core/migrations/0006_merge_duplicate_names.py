@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:34
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags and ingredients a user has more than once by name."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field).through
+        fk = f'{model_name.lower()}_id'
+
+        duplicates = model.objects.values('user', 'name').annotate(
+            keep=Min('id'),
+            count=Count('id'),
+        ).filter(count__gt=1)
+        for duplicate in duplicates:
+            keep = duplicate['keep']
+            others = model.objects.filter(
+                user=duplicate['user'],
+                name=duplicate['name'],
+            ).exclude(id=keep)
+            recipe_ids = set(through.objects.filter(
+                **{f'{fk}__in': others}
+            ).values_list('recipe_id', flat=True))
+            recipe_ids -= set(through.objects.filter(
+                **{fk: keep}
+            ).values_list('recipe_id', flat=True))
+            through.objects.bulk_create([
+                through(recipe_id=recipe_id, **{fk: keep})
+                for recipe_id in recipe_ids
+            ])
+            others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names,
+            migrations.RunPython.noop,
+        ),
+    ]
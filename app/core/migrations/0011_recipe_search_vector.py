@@ -0,0 +1,56 @@
+# Generated by Django 3.2.25 on 2026-10-17 07:05
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_search_vectors(apps, schema_editor):
+    """Compute the search vector of the existing recipes."""
+    Recipe = apps.get_model('core', 'Recipe')
+    config = settings.RECIPE_SEARCH_CONFIG
+
+    def names(field):
+        through = Recipe._meta.get_field(field).remote_field.through
+        return Coalesce(Subquery(
+            through.objects.filter(recipe=OuterRef('pk')).values(
+                'recipe',
+            ).annotate(
+                names=StringAgg(f'{field[:-1]}__name', ' '),
+            ).values('names')
+        ), Value(''))
+
+    Recipe.objects.update(search_vector=(
+        SearchVector('title', weight='A', config=config) +
+        SearchVector(
+            names('tags'), names('ingredients'), weight='B', config=config
+        ) +
+        SearchVector('description', weight='C', config=config)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_content_addressed_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Filled before the index is built, rather than updating it row
+        # by row.
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-17 05:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    """Count the recipes of the existing tags and ingredients."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for field in ('tags', 'ingredients'):
+        through = Recipe._meta.get_field(field).remote_field.through
+        column = f'{field[:-1]}_id'
+        model = Recipe._meta.get_field(field).related_model
+        model.objects.update(recipe_count=Coalesce(Subquery(
+            through.objects.filter(**{column: OuterRef('pk')}).values(
+                column,
+            ).annotate(count=Count('pk')).values('count')
+        ), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_range_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        # Counted before the indexes are built.
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count', 'name'], name='ingredient_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count', 'name'], name='tag_user_count_idx'),
+        ),
+    ]
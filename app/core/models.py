@@ -6,7 +6,10 @@ import os
 
 from typing import Type
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -14,6 +17,8 @@ from django.contrib.auth.models import (
 )
 from django.db.models.manager import BaseManager
 
+from core.storage import recipe_image_storage
+
 
 def recipe_image_file_path(instance, filename):
     """Generates a file path for a recipe image."""
@@ -63,6 +68,17 @@ class User(AbstractBaseUser, PermissionsMixin):
 class Recipe(models.Model):
     """Recipe object."""
 
+    IMAGE_PENDING = 'pending'
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_PROCESSING, 'Processing'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -77,11 +93,80 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(
             upload_to=recipe_image_file_path,
+            storage=recipe_image_storage,
             null=True
         )
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUS_CHOICES,
+        blank=True,
+    )
+    image_variants = models.JSONField(default=dict, blank=True)
+    """Storage names of the resized images, by size and format."""
+    version = models.PositiveIntegerField(default=1, editable=False)
+    """Bumped on every change to the recipe or its tags/ingredients."""
+    updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    """Title, tags, ingredients and description, see recipe.search."""
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+            # Range filters and orderings of the list, ending in the id so
+            # ties are in cursor order too.
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='recipe_user_time_idx',
+            ),
+            models.Index(
+                fields=['user', 'price', 'id'],
+                name='recipe_user_price_idx',
+            ),
+            # Images are shared between recipes with the same one.
+            models.Index(fields=['image'], name='recipe_image_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        """
+        Save the recipe, bumping its version if it already exists.
+
+        The version is incremented in the UPDATE and read back, so
+        concurrent saves of the same recipe each get a version of their own.
+        The search vector is left to recipe.search, rather than written
+        back as it was loaded.
+        """
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+
+        self.version = models.F('version') + 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            # Like Django, only the loaded fields, but always the
+            # modification time.
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.attname for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred and
+                field.attname != 'search_vector'
+            ]
+        kwargs['update_fields'] = {*update_fields, 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
+    def bump_version(self):
+        """Bump the version after a change that does not save the recipe."""
+        now = timezone.now()
+        Recipe.objects.filter(pk=self.pk).update(
+            version=models.F('version') + 1,
+            updated_at=now,
+        )
+        self.refresh_from_db(fields=['version'])
+        self.updated_at = now
     
 class Tag(models.Model):
     """Tag object for filtering recipe."""
@@ -91,6 +176,29 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    """Number of recipes using it, see recipe.counts."""
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_user_tag_name',
+            ),
+        ]
+        indexes = [
+            # Assigned ones, and the most used first.
+            models.Index(
+                fields=['user', 'recipe_count', 'name'],
+                name='tag_user_count_idx',
+            ),
+            # Trigrams of the names, for autocomplete.
+            GinIndex(
+                fields=['name'],
+                opclasses=['gin_trgm_ops'],
+                name='tag_name_trgm_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -103,6 +211,29 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+    """Number of recipes using it, see recipe.counts."""
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_user_ingredient_name',
+            ),
+        ]
+        indexes = [
+            # Assigned ones, and the most used first.
+            models.Index(
+                fields=['user', 'recipe_count', 'name'],
+                name='ingredient_user_count_idx',
+            ),
+            # Trigrams of the names, for autocomplete.
+            GinIndex(
+                fields=['name'],
+                opclasses=['gin_trgm_ops'],
+                name='ingredient_name_trgm_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""
+Renderers for the APIs.
+
+JSON is encoded with orjson, which is several times faster than the
+standard library encoder DRF uses, and MessagePack is offered to the
+internal services that ask for it with their Accept header. Both write
+the same data DRF's JSONRenderer would.
+"""
+import decimal
+
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+_encoder = JSONEncoder()
+
+# JSONRenderer escapes these, so the output is valid JavaScript too.
+_LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+
+def encode_default(obj):
+    """
+    Return a value orjson and msgpack can encode for obj.
+
+    Decimals are encoded as the serializer fields represent them, strings
+    unless COERCE_DECIMAL_TO_STRING is turned off. Anything else is left
+    to DRF's encoder, so lazy strings, dates, querysets and so on come
+    out as they would with JSONRenderer.
+    """
+    if isinstance(obj, decimal.Decimal):
+        if api_settings.COERCE_DECIMAL_TO_STRING:
+            return str(obj)
+        return float(obj)
+
+    return _encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """Render JSON with orjson."""
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if indent or not self.compact:
+            # orjson only writes compact JSON or indents by two spaces,
+            # let DRF lay out JSON for the browsable API and the like.
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+
+        ret = orjson.dumps(data, default=encode_default, option=self.options)
+        for separator, escaped in _LINE_SEPARATORS:
+            ret = ret.replace(separator, escaped)
+
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render MessagePack, for the clients that accept it."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
@@ -0,0 +1,116 @@
+"""
+Database router sending reads to the replicas in DATABASE_REPLICAS.
+
+Only the reads made inside `replica_reads()` go to a replica, the views
+decide which requests can do without the latest writes. A replica that
+can't be reached, or lags more than DB_REPLICA_MAX_LAG seconds behind the
+primary, isn't read from until it has caught up.
+"""
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, DatabaseError, DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+# Zero on a primary, such as a second local database, and on a replica
+# that has replayed everything it received, however long ago that was.
+LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+'''
+
+_replica = ContextVar('replica', default=None)
+
+# Per process, by alias: when the replica was last checked and whether
+# it could be read from then.
+_checks = {}
+
+
+def replica_lag(alias):
+    """Return how many seconds the replica is behind the primary."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        lag = cursor.fetchone()[0]
+
+    return float(lag or 0)
+
+
+def _usable(alias):
+    """Return whether the replica can be read from now."""
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError:
+        logger.warning('Replica %s is unavailable.', alias, exc_info=True)
+        return False
+    if lag > settings.DB_REPLICA_MAX_LAG:
+        logger.warning('Replica %s is %.1fs behind the primary.', alias, lag)
+        return False
+
+    return True
+
+
+def usable_replicas():
+    """Return the replicas that were usable when last checked."""
+    now = time.monotonic()
+    replicas = []
+    for alias in settings.DATABASE_REPLICAS:
+        checked_at, usable = _checks.get(alias, (None, False))
+        if (
+            checked_at is None or
+            now - checked_at >= settings.DB_REPLICA_LAG_CHECK_INTERVAL
+        ):
+            usable = _usable(alias)
+            _checks[alias] = (now, usable)
+        if usable:
+            replicas.append(alias)
+
+    return replicas
+
+
+@contextmanager
+def replica_reads():
+    """
+    Send the reads made in the block to one usable replica.
+
+    The same replica serves every read, so they see the same state. The
+    reads go to the primary when no replica is usable.
+    """
+    replicas = usable_replicas()
+    token = _replica.set(random.choice(replicas) if replicas else None)
+    try:
+        yield _replica.get()
+    finally:
+        _replica.reset(token)
+
+
+class ReplicaRouter:
+    """Route reads in `replica_reads()` to a replica, the rest to primary."""
+
+    def db_for_read(self, model, **hints):
+        return _replica.get()
+
+    def db_for_write(self, model, **hints):
+        # Not the database of the instance, which may be a replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas have the schema of the primary.
+        if db in settings.DATABASE_REPLICAS:
+            return False
+
+        return None
@@ -0,0 +1,70 @@
+"""
+Signal handlers for the core models.
+
+A recipe's representation includes its tags and ingredients, so changes
+to its relations, and renames or deletions of a related tag or
+ingredient, bump the version of every recipe affected.
+"""
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from core.authentication import token_cache
+from core.models import Ingredient, Recipe, Tag, User
+
+RELATION_FIELDS = {
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+}
+
+
+def bump_recipe_versions(recipes):
+    """Bump the version of every recipe in the queryset."""
+    recipes.update(version=F('version') + 1, updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def bump_on_relations_changed(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    """Bump the versions of recipes whose tags or ingredients changed."""
+    if not reverse:
+        if action.startswith('post_'):
+            instance.bump_version()
+    elif action == 'pre_clear':
+        field = RELATION_FIELDS[type(instance)]
+        bump_recipe_versions(Recipe.objects.filter(**{field: instance}))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        bump_recipe_versions(Recipe.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def bump_on_related_changed(sender, instance, created=False, **kwargs):
+    """Bump the versions of recipes using a renamed or deleted object."""
+    if not created:
+        field = RELATION_FIELDS[sender]
+        bump_recipe_versions(Recipe.objects.filter(**{field: instance}))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a deleted token."""
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop cached tokens of a changed user, e.g. when deactivated."""
+    if not created:
+        token_cache.delete_user(instance.pk)
@@ -0,0 +1,83 @@
+"""
+Content addressed file storage.
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files by the SHA-256 of their content.
+
+    A file saved as `uploads/recipe/photo.jpg` is stored as
+    `uploads/recipe/<2 digits>/<digest>.jpg`, so saving the same bytes
+    again returns the existing file instead of writing a copy. Files may
+    then be shared, so they are never deleted when one reference goes
+    away; `manage.py collect_orphan_images` removes unreferenced ones.
+    """
+
+    def hashed_name(self, name, digest):
+        """Return the name of a file saved as name with the digest."""
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+
+        return os.path.join(directory, digest[:2], f'{digest}{ext}')
+
+    def get_available_name(self, name, max_length=None):
+        # A name is only ever used for the same content.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+
+        name = self.hashed_name(name, digest.hexdigest())
+        if self.touch(name):
+            return name
+
+        # Written under a unique name first, so readers never see part of
+        # a file and concurrent saves of the same content don't collide.
+        temp_name = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temp_name), self.path(name))
+
+        return name
+
+    def store(self, temp_name, name, digest):
+        """
+        Move a file already written to this storage to its hashed name.
+
+        For files hashed while they were written, which saves reading
+        them again. Returns the hashed name.
+        """
+        name = self.hashed_name(name, digest)
+        if self.touch(name):
+            self.delete(temp_name)
+            return name
+
+        os.makedirs(os.path.dirname(self.path(name)), exist_ok=True)
+        os.replace(self.path(temp_name), self.path(name))
+
+        return name
+
+    def touch(self, name):
+        """
+        Mark a file as just used, so it isn't collected as an orphan.
+
+        Returns whether the file exists.
+        """
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+
+        return True
+
+
+recipe_image_storage = ContentAddressedStorage()
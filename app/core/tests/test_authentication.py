@@ -0,0 +1,186 @@
+"""
+Tests for the cached token authentication.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import (
+    LocalTokenCache,
+    SharedTokenCache,
+    token_cache,
+)
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating with cached tokens."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+            name='Test Name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """Test the token is only looked up on the first request."""
+        self.client.get(ME_URL)
+
+        # Only the view reads the user, to show it as it is now.
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_deleted_token_rejected(self):
+        """Test a deleted token stops authenticating."""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """Test a deactivated user stops authenticating."""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_update_visible(self):
+        """Test changes to the user are seen on the next request."""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'name': 'Updated Name'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Updated Name')
+
+    def test_stale_user_not_written_back(self):
+        """Test updating a user doesn't save a stale cached copy."""
+        self.client.get(ME_URL)
+        # As another worker would, without evicting this one's copy.
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            password=make_password('newpass123'), name='Renamed',
+        )
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data['name'], 'Renamed')
+        self.client.patch(ME_URL, {'email': 'new@example.com'})
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass123'))
+        self.assertEqual(self.user.name, 'Renamed')
+
+
+class LocalTokenCacheTests(TestCase):
+    """Test the in-process token cache."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def test_least_recently_used_evicted(self):
+        """Test the cache keeps at most max_size tokens."""
+        cache = LocalTokenCache(max_size=1, timeout=60)
+        other = Token.objects.create(
+            user=get_user_model().objects.create_user(
+                email='other@example.com',
+                password='testpass123',
+            )
+        )
+
+        cache.set(self.token)
+        cache.set(other)
+
+        self.assertIsNone(cache.get(self.token.key))
+        self.assertEqual(cache.get(other.key), (other.user_id, True))
+
+    @patch('core.authentication.time.monotonic')
+    def test_expired_token_dropped(self, patched_monotonic):
+        """Test tokens expire after the timeout."""
+        cache = LocalTokenCache(max_size=10, timeout=60)
+        patched_monotonic.return_value = 100
+        cache.set(self.token)
+
+        patched_monotonic.return_value = 159
+        self.assertIsNotNone(cache.get(self.token.key))
+        patched_monotonic.return_value = 161
+        self.assertIsNone(cache.get(self.token.key))
+
+    def test_user_not_cached(self):
+        """Test only the user's id and is_active are cached."""
+        cache = LocalTokenCache(max_size=10, timeout=60)
+        cache.set(self.token)
+
+        self.assertEqual(cache.get(self.token.key), (self.user.pk, True))
+
+    def test_delete_user(self):
+        """Test deleting a user's tokens keeps the others."""
+        cache = LocalTokenCache(max_size=10, timeout=60)
+        other = Token.objects.create(
+            user=get_user_model().objects.create_user(
+                email='other@example.com',
+                password='testpass123',
+            )
+        )
+        cache.set(self.token)
+        cache.set(other)
+
+        cache.delete_user(self.user.pk)
+
+        self.assertIsNone(cache.get(self.token.key))
+        self.assertIsNotNone(cache.get(other.key))
+
+
+class SharedTokenCacheTests(TestCase):
+    """Test the token cache stored in a Django cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+
+    def test_user_not_cached(self):
+        """Test the password hash is not written to the cache."""
+        shared = SharedTokenCache('default', timeout=60)
+        shared.set(self.token)
+
+        self.assertEqual(shared.get(self.token.key), (self.user.pk, True))
+        self.assertEqual(
+            cache.get(f'token-auth:{self.token.key}'), (self.user.pk, True)
+        )
+
+    def test_delete_user(self):
+        """Test deleting a user's tokens."""
+        shared = SharedTokenCache('default', timeout=60)
+        shared.set(self.token)
+
+        shared.delete_user(self.user.pk)
+
+        self.assertIsNone(shared.get(self.token.key))
@@ -0,0 +1,79 @@
+"""
+Tests for the health checks of persistent database connections.
+"""
+from unittest.mock import patch
+
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+
+from core.models import User
+
+
+def start_request():
+    """Run the handlers of a request starting, as the WSGI handler does."""
+    request_started.send(sender=None)
+
+
+class HealthCheckTests(TransactionTestCase):
+    """Test kept connections are checked before they're reused."""
+
+    def setUp(self):
+        patcher = patch.dict(connection.settings_dict, {
+            'CONN_MAX_AGE': 60,
+            'CONN_HEALTH_CHECKS': True,
+        })
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        connection.close()
+        connection.ensure_connection()
+
+    def tearDown(self):
+        connection.close()
+
+    def test_checked_once_per_request(self):
+        """Test the connection is checked on its first use only."""
+        start_request()
+
+        with patch.object(
+            connection, 'is_usable', wraps=connection.is_usable,
+        ) as is_usable:
+            User.objects.count()
+            User.objects.count()
+
+        is_usable.assert_called_once()
+
+    def test_not_checked_unused(self):
+        """Test requests not using the database don't check it."""
+        with patch.object(connection, 'is_usable') as is_usable:
+            start_request()
+            start_request()
+
+        is_usable.assert_not_called()
+
+    def test_broken_connection_replaced(self):
+        """Test a connection that stopped working is replaced."""
+        broken = connection.connection
+        broken.close()
+        start_request()
+
+        self.assertEqual(User.objects.count(), 0)
+        self.assertIsNot(connection.connection, broken)
+
+    def test_checked_before_transaction(self):
+        """Test a broken connection is replaced before a transaction."""
+        connection.connection.close()
+        start_request()
+
+        with transaction.atomic():
+            self.assertEqual(User.objects.count(), 0)
+
+    def test_checks_disabled(self):
+        """Test connections aren't checked without CONN_HEALTH_CHECKS."""
+        connection.settings_dict['CONN_HEALTH_CHECKS'] = False
+        start_request()
+
+        with patch.object(connection, 'is_usable') as is_usable:
+            User.objects.count()
+
+        is_usable.assert_not_called()
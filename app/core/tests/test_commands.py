@@ -6,7 +6,8 @@ from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
 from django.core.management import call_command
 from django.db.utils import OperationalError # noqa
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+from io import StringIO
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -26,3 +27,15 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class IndexUsageCommandTests(TestCase):
+    """Test the index usage command"""
+    def test_index_usage_lists_indexes(self):
+        """Test index usage reports the lookup indexes"""
+        out = StringIO()
+        call_command('index_usage', stdout=out)
+        output = out.getvalue()
+        self.assertIn('recipe_user_id_idx', output)
+        self.assertIn('unique_user_tag_name', output)
+        self.assertIn('core_recipe_tags_tag_recipe_idx', output)
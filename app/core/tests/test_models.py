@@ -5,6 +5,7 @@ from unittest.mock  import patch
 
 from core import models
 from decimal import Decimal
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
@@ -84,6 +85,74 @@ class TestModels(TestCase):
         self.assertEqual(str(ingredient), ingredient.name)
 
 
+    def test_tag_name_unique_per_user(self):
+        """Test a user cannot have two tags with the same name."""
+        user = create_user()
+        other_user = create_user(email='other@example.com')
+        models.Tag.objects.create(user=user, name='Vegan')
+        models.Tag.objects.create(user=other_user, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Vegan')
+
+    def test_ingredient_name_unique_per_user(self):
+        """Test a user cannot have two ingredients with the same name."""
+        user = create_user()
+        models.Ingredient.objects.create(user=user, name='Salt')
+
+        with self.assertRaises(IntegrityError):
+            models.Ingredient.objects.create(user=user, name='Salt')
+
+    def test_recipe_version_bumped_on_save(self):
+        """Test saving a recipe bumps its version."""
+        recipe = models.Recipe.objects.create(
+            user=create_user(),
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('3.50'),
+        )
+        self.assertEqual(recipe.version, 1)
+
+        recipe.title = 'New title'
+        recipe.save(update_fields=['title'])
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.version, 2)
+
+    def test_recipe_version_bumped_on_stale_save(self):
+        """Test saving two copies of a recipe gives each its own version."""
+        recipe = models.Recipe.objects.create(
+            user=create_user(),
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('3.50'),
+        )
+        copy = models.Recipe.objects.get(pk=recipe.pk)
+
+        recipe.save()
+        copy.save()
+
+        self.assertEqual((recipe.version, copy.version), (2, 3))
+        copy.refresh_from_db()
+        self.assertEqual(copy.version, 3)
+
+    def test_recipe_version_bumped_on_relations(self):
+        """Test changing recipe tags from either side bumps its version."""
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('3.50'),
+        )
+        tag = models.Tag.objects.create(user=user, name='Vegan')
+
+        recipe.tags.add(tag)
+        self.assertEqual(recipe.version, 2)
+        tag.recipe_set.clear()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.version, 3)
+
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
         """Test generate file path."""
@@ -0,0 +1,134 @@
+"""
+Tests for the orjson and MessagePack renderers and parsers.
+"""
+import datetime
+import uuid
+from decimal import Decimal
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+
+from rest_framework import status
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RendererTests(TestCase):
+    """Test rendering data as DRF's JSONRenderer does."""
+
+    def test_same_as_json_renderer(self):
+        """Test the JSON is byte for byte JSONRenderer's."""
+        data = {
+            'title': 'Crème brûlée \u2028 "quoted"',
+            'when': datetime.datetime(
+                2021, 6, 1, 12, 30, 5, 1234, tzinfo=datetime.timezone.utc,
+            ),
+            'day': datetime.date(2021, 6, 1),
+            'uuid': uuid.UUID(int=1),
+            'lazy': gettext_lazy('Lazy'),
+            'error': [ErrorDetail('Required.', code='required')],
+            'nested': [{1: None, 'ratio': 0.5, 'ok': True}],
+        }
+
+        self.assertEqual(
+            ORJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_decimals_as_strings(self):
+        """Test decimals keep their places, as DecimalField renders them."""
+        data = {'price': Decimal('5.10')}
+
+        self.assertEqual(ORJSONRenderer().render(data), b'{"price":"5.10"}')
+        self.assertEqual(
+            msgpack.unpackb(MessagePackRenderer().render(data)),
+            {'price': '5.10'},
+        )
+
+    def test_indented(self):
+        """Test indented JSON is left to JSONRenderer."""
+        data = {'tags': [{'name': 'Vegan'}]}
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            ORJSONRenderer().render(data, media_type),
+            JSONRenderer().render(data, media_type),
+        )
+
+
+class ContentNegotiationTests(TestCase):
+    """Test the APIs speak JSON and MessagePack."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(
+            user=self.user,
+            title='Curry',
+            time_minutes=20,
+            price=Decimal('4.50'),
+        )
+
+    def test_json_by_default(self):
+        """Test JSON is rendered without an Accept header."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(res.json()[0]['price'], '4.50')
+
+    def test_msgpack_list(self):
+        """Test MessagePack is rendered for clients accepting it."""
+        json_res = self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content), json_res.json())
+
+    def test_msgpack_create(self):
+        """Test recipes can be created from MessagePack."""
+        payload = {
+            'title': 'Soup',
+            'time_minutes': 15,
+            'price': '2.25',
+            'tags': [{'name': 'Lunch'}],
+        }
+
+        res = self.client.post(
+            RECIPES_URL,
+            msgpack.packb(payload),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        data = msgpack.unpackb(res.content)
+        self.assertEqual(data['price'], '2.25')
+        self.assertEqual(data['tags'][0]['name'], 'Lunch')
+        recipe = Recipe.objects.get(pk=data['id'])
+        self.assertEqual(recipe.price, Decimal('2.25'))
+
+    def test_malformed_bodies(self):
+        """Test malformed JSON and MessagePack are bad requests."""
+        for body, content_type in (
+            (b'{"title": ', 'application/json'),
+            (b'\xc1', 'application/msgpack'),
+        ):
+            res = self.client.post(
+                RECIPES_URL, body, content_type=content_type,
+            )
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('parse error', res.json()['detail'])
@@ -0,0 +1,132 @@
+"""
+Tests for reading from the database replicas.
+"""
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, OperationalError
+from django.test import override_settings, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import routers
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """Return the recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica'], DB_REPLICA_PIN_SECONDS=0,
+    RECIPE_LIST_CACHE_ALIAS='default',
+)
+class ReplicaRouterTests(TransactionTestCase):
+    """Test safe reads of the recipe APIs go to a replica."""
+
+    def setUp(self):
+        # A second connection to the test database stands in for a
+        # replica, which sees what the tests commit.
+        connections.databases['replica'] = dict(
+            connections['default'].settings_dict
+        )
+        self.addCleanup(connections.databases.pop, 'replica')
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+        routers._checks.clear()
+        cache.clear()
+
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Curry',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def _replica_reads(self, *args, method='get', **kwargs):
+        """Make a request, and return it and whether it read the replica."""
+        with CaptureQueriesContext(connections['replica']) as queries:
+            res = getattr(self.client, method)(*args, **kwargs)
+
+        return res, any('core_recipe' in q['sql'] for q in queries)
+
+    def test_list_and_retrieve_from_replica(self):
+        """Test lists and details are read from the replica."""
+        res, replica = self._replica_reads(RECIPES_URL)
+        self.assertEqual(res.data[0]['title'], 'Curry')
+        self.assertTrue(replica)
+
+        res, replica = self._replica_reads(detail_url(self.recipe.id))
+        self.assertEqual(res.data['title'], 'Curry')
+        self.assertTrue(replica)
+
+    def test_writes_to_primary(self):
+        """Test changes are read and written on the primary."""
+        res, replica = self._replica_reads(
+            detail_url(self.recipe.id), {'title': 'Stew'}, method='patch',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(replica)
+
+    @override_settings(DB_REPLICA_PIN_SECONDS=60)
+    def test_pinned_after_write(self):
+        """Test a user reads the primary for a while after a change."""
+        later = time.time_ns() + 120 * 1_000_000_000
+        with patch('time.time_ns', return_value=later):
+            _, replica = self._replica_reads(RECIPES_URL)
+            self.assertTrue(replica)
+
+            self.client.patch(detail_url(self.recipe.id), {'title': 'Stew'})
+            res, replica = self._replica_reads(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['title'], 'Stew')
+        self.assertFalse(replica)
+
+    def test_lagging_replica(self):
+        """Test a replica that is too far behind isn't read from."""
+        with patch('core.routers.replica_lag', return_value=60) as lag, \
+                self.assertLogs('core.routers', 'WARNING'):
+            _, replica = self._replica_reads(RECIPES_URL)
+            self._replica_reads(detail_url(self.recipe.id))
+
+        self.assertFalse(replica)
+        # The lag is checked once per interval.
+        lag.assert_called_once_with('replica')
+
+    def test_unavailable_replica(self):
+        """Test the primary is read when the replica can't be reached."""
+        with patch(
+            'core.routers.replica_lag',
+            side_effect=OperationalError('could not connect'),
+        ), self.assertLogs('core.routers', 'WARNING'):
+            res, replica = self._replica_reads(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(replica)
+
+    def test_lag_of_primary(self):
+        """Test a database that isn't replicating has no lag."""
+        self.assertEqual(routers.replica_lag('replica'), 0)
+
+    def test_no_migrations_on_replica(self):
+        """Test migrations are only applied to the primary."""
+        router = routers.ReplicaRouter()
+
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+        self.assertIsNone(router.allow_migrate('default', 'core'))
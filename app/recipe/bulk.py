@@ -0,0 +1,303 @@
+"""
+Bulk import and export of recipes as JSON Lines.
+
+Each line holds one recipe in the shape of the recipe detail API, with
+tags and ingredients given by name. Imports are read a line at a time and
+written in batches, each with a few bulk inserts in its own transaction.
+Exports read the recipes through a server-side cursor, loading the tags
+and ingredients of each batch with one query apiece, and can also be
+encoded as a JSON array or CSV. Either way memory use stays the same
+however many recipes there are.
+"""
+import csv
+import json
+import logging
+import time
+from itertools import islice
+
+from django.db import connections, transaction
+from rest_framework.exceptions import ValidationError
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import bump_user_version_on_commit
+from recipe.counts import update_recipe_counts
+from recipe.pagination import seek_after
+from recipe.search import update_search_vectors
+from recipe.serializers import get_or_create_named, RecipeDetailSerializer
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+"""Recipes validated and inserted, or exported, per batch."""
+
+EXPORT_FIELDS = (
+    'id', 'title', 'time_minutes', 'price', 'link', 'description',
+)
+
+# Validated fields that are relations rather than Recipe columns.
+RELATIONS = (('tags', Tag), ('ingredients', Ingredient))
+
+
+class ImportResult:
+    """Outcome of a bulk import."""
+
+    max_errors = 100
+    """Number of invalid lines whose errors are kept."""
+
+    def __init__(self):
+        self.created = 0
+        self.invalid = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def add_error(self, line, errors):
+        """Record an invalid line."""
+        self.invalid += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    @property
+    def rows_per_second(self):
+        """Return the import rate, counting invalid lines too."""
+        if not self.seconds:
+            return 0.0
+
+        return (self.created + self.invalid) / self.seconds
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'invalid': self.invalid,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def import_recipes(user, lines, batch_size=BATCH_SIZE):
+    """
+    Create the user's recipes from an iterable of JSON lines.
+
+    Invalid lines are skipped and reported in the result. Every batch is
+    committed as it is written, so a failure part way through keeps the
+    batches before it.
+    """
+    result = ImportResult()
+    start = time.perf_counter()
+    serializer = RecipeDetailSerializer()
+    batch = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(serializer.run_validation(json.loads(line)))
+        except ValueError as error:
+            result.add_error(number, {
+                'non_field_errors': [f'Invalid JSON: {error}'],
+            })
+        except ValidationError as error:
+            result.add_error(number, error.detail)
+
+        if len(batch) >= batch_size:
+            result.created += _create_batch(user, batch)
+            batch = []
+    if batch:
+        result.created += _create_batch(user, batch)
+
+    result.seconds = time.perf_counter() - start
+    logger.info(
+        'Imported %d recipes for user %s in %.2fs (%.0f rows/sec).',
+        result.created, user.pk, result.seconds, result.rows_per_second,
+    )
+    return result
+
+
+@transaction.atomic
+def _create_batch(user, batch):
+    """Insert a batch of validated recipes and their relations."""
+    related = {}
+    for field, model in RELATIONS:
+        names = list(dict.fromkeys(
+            item['name'] for data in batch for item in data.get(field, [])
+        ))
+        related[field] = get_or_create_named(model, user, names)
+
+    recipes = Recipe.objects.bulk_create([
+        Recipe(user=user, **{
+            key: value for key, value in data.items()
+            if key not in related
+        })
+        for data in batch
+    ])
+
+    for field, objs in related.items():
+        through = getattr(Recipe, field).through
+        column = through._meta.get_field(field[:-1]).attname
+        through.objects.bulk_create([
+            through(recipe_id=recipe.pk, **{column: objs[name].pk})
+            for recipe, data in zip(recipes, batch)
+            for name in dict.fromkeys(
+                item['name'] for item in data.get(field, [])
+            )
+        ])
+
+    # Bulk inserts don't send the signals that maintain the search vector
+    # and recipe counts, and invalidate cached lists.
+    update_search_vectors(
+        Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes])
+    )
+    for field, objs in related.items():
+        update_recipe_counts(field, [obj.pk for obj in objs.values()])
+    bump_user_version_on_commit(user.pk)
+
+    return len(recipes)
+
+
+def _batches(iterable, size):
+    """Yield lists of up to size items from iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _related_names(field, recipe_ids):
+    """Return the tags or ingredients of the recipes, by recipe id."""
+    through = getattr(Recipe, field).through
+    related = {}
+    rows = through.objects.filter(recipe_id__in=recipe_ids).order_by(
+        'id',
+    ).values_list('recipe_id', f'{field[:-1]}_id', f'{field[:-1]}__name')
+    for recipe_id, pk, name in rows:
+        related.setdefault(recipe_id, []).append({'id': pk, 'name': name})
+
+    return related
+
+
+def _row_batches(queryset, batch_size):
+    """
+    Yield batches of the export columns of queryset, in its ordering, or
+    in id order if it has none.
+    """
+    ordering = tuple(queryset.query.order_by) or ('id',)
+    if not {'id', '-id'} & set(ordering):
+        ordering += ('id',)
+    fields = [field.lstrip('-') for field in ordering]
+    # Ordered by columns such as the search rank, which aren't exported.
+    unexported = [field for field in fields if field not in EXPORT_FIELDS]
+    rows = queryset.order_by(*ordering).values(*EXPORT_FIELDS, *unexported)
+
+    if not connections[rows.db].settings_dict['DISABLE_SERVER_SIDE_CURSORS']:
+        batches = _batches(rows.iterator(chunk_size=batch_size), batch_size)
+    else:
+        batches = _keyset_batches(rows, ordering, batch_size)
+    for batch in batches:
+        for row in batch:
+            for field in unexported:
+                del row[field]
+        yield batch
+
+
+def _keyset_batches(rows, ordering, batch_size):
+    """
+    Yield batches of rows a page at a time, seeking past the ordering
+    values of the last row of each.
+
+    Without server-side cursors, as behind pgbouncer, the iterator would
+    fetch every row at once.
+    """
+    fields = [field.lstrip('-') for field in ordering]
+    page = rows
+    while True:
+        batch = list(page[:batch_size])
+        if len(batch) < batch_size:
+            if batch:
+                yield batch
+            return
+        after = [batch[-1][field] for field in fields]
+        yield batch
+        page = rows.filter(seek_after(ordering, after))
+
+
+def export_rows(queryset, batch_size=BATCH_SIZE):
+    """
+    Yield batches of the recipes of queryset as dicts.
+
+    Recipes are read in the order of queryset through a server-side
+    cursor batch_size at a time, or a page at a time where server-side
+    cursors are disabled,
+    and the tags and ingredients of each batch are loaded with one query
+    apiece, so only one batch is in memory at once.
+    """
+    start = time.perf_counter()
+    count = 0
+    for batch in _row_batches(queryset, batch_size):
+        ids = [row['id'] for row in batch]
+        related = {field: _related_names(field, ids) for field, _ in RELATIONS}
+        for row in batch:
+            row['price'] = str(row['price'])
+            for field, recipes in related.items():
+                row[field] = recipes.get(row['id'], [])
+        yield batch
+        count += len(batch)
+
+    seconds = time.perf_counter() - start
+    logger.info(
+        'Exported %d recipes in %.2fs (%.0f rows/sec).',
+        count, seconds, count / seconds if seconds else 0,
+    )
+
+
+def _encode_ndjson(batches):
+    """Encode batches of recipes as JSON Lines."""
+    for batch in batches:
+        yield ''.join(json.dumps(row) + '\n' for row in batch)
+
+
+def _encode_json(batches):
+    """Encode batches of recipes as one JSON array."""
+    separator = '['
+    for batch in batches:
+        yield separator + ',\n'.join(json.dumps(row) for row in batch)
+        separator = ',\n'
+    yield '[]' if separator == '[' else ']'
+
+
+class _Echo:
+    """File-like object returning what is written, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _encode_csv(batches):
+    """
+    Encode batches of recipes as CSV.
+
+    Tags and ingredients are listed by name in one column each,
+    separated by semicolons.
+    """
+    writer = csv.writer(_Echo())
+    columns = [*EXPORT_FIELDS, *(field for field, _ in RELATIONS)]
+    yield writer.writerow(columns)
+    for batch in batches:
+        yield ''.join(writer.writerow([
+            '; '.join(item['name'] for item in row[column])
+            if isinstance(row[column], list) else row[column]
+            for column in columns
+        ]) for row in batch)
+
+
+EXPORT_FORMATS = {
+    'ndjson': _encode_ndjson,
+    'json': _encode_json,
+    'csv': _encode_csv,
+}
+"""Encoders of exported recipes by format."""
+
+
+def export_recipes(queryset, export_format='ndjson', batch_size=BATCH_SIZE):
+    """Yield the recipes of queryset encoded in export_format, by batch."""
+    return EXPORT_FORMATS[export_format](export_rows(queryset, batch_size))
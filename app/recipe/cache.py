@@ -0,0 +1,140 @@
+"""
+Per-user caching of the recipe API list responses.
+
+Every user has a cache version that is bumped whenever a change to one
+of their recipes, tags or ingredients commits (see recipe.signals). Cached list
+data and ETags are keyed on that version, so a write invalidates all of
+the user's cached lists at once and nothing has to be deleted.
+
+Nothing is cached unless RECIPE_LIST_CACHE_ALIAS names a cache, which is
+only the case by default when it is shared by every worker.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def caching_enabled():
+    """Return whether a cache is configured for list responses."""
+    return settings.RECIPE_LIST_CACHE_ALIAS is not None
+
+
+def _cache():
+    """Return the cache backend for list responses."""
+    return caches[settings.RECIPE_LIST_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    """Return the cache key of a user's version."""
+    return f'recipe-api:{user_id}:version'
+
+
+def get_user_version(user_id):
+    """Return the user's cache version, starting a new one if needed."""
+    cache = _cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_user_version(user_id):
+    """Invalidate every cached list response of the user."""
+    if caching_enabled():
+        _cache().set(_version_key(user_id), time.time_ns(), None)
+
+
+def bump_user_version_on_commit(user_id):
+    """
+    Invalidate every cached list response of the user once the current
+    transaction commits.
+
+    Bumping earlier would let a request reading the data before the
+    commit cache it under the new version.
+    """
+    if caching_enabled():
+        transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+def get_or_set_user_data(user_id, parts, default, timeout):
+    """
+    Return the user's cached data for parts, setting what the default
+    callable returns on a miss.
+
+    The key includes the user's version, so the data is missed as soon as
+    the user changes anything, whatever the timeout.
+    """
+    if not caching_enabled():
+        return default()
+
+    key = hashlib.md5('|'.join(
+        [str(user_id), str(get_user_version(user_id)), *parts]
+    ).encode()).hexdigest()
+
+    return _cache().get_or_set(f'recipe-api:data:{key}', default, timeout)
+
+
+class CachedListMixin:
+    """
+    Serve list responses from a per-user, per-query-string cache.
+
+    Responses carry an ETag and Last-Modified derived from the user's
+    cache version, so clients polling an unchanged list get a 304 without
+    the queryset or serializer being touched.
+    """
+
+    def list(self, request, *args, **kwargs):
+        """List objects, from the cache when the user's data is unchanged."""
+        if not caching_enabled():
+            return super().list(request, *args, **kwargs)
+
+        version = get_user_version(request.user.pk)
+        key = hashlib.md5('|'.join([
+            str(request.user.pk),
+            str(version),
+            self.basename,
+            request.accepted_media_type,
+            request.get_full_path(),
+        ]).encode()).hexdigest()
+        headers = {
+            'ETag': f'"{key}"',
+            'Last-Modified': http_date(version // 1_000_000_000),
+            'Cache-Control': 'private, no-cache',
+        }
+
+        response = get_conditional_response(
+            request,
+            etag=headers['ETag'],
+            last_modified=version // 1_000_000_000,
+        )
+        if response is None:
+            response = self._cached_list(key, request, *args, **kwargs)
+        for header, value in headers.items():
+            response[header] = value
+
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+    def _cached_list(self, key, request, *args, **kwargs):
+        """Return the list response for key, rendering it on a miss."""
+        cache_key = f'recipe-api:list:{key}'
+        data = _cache().get(cache_key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        _cache().set(
+            cache_key,
+            response.data,
+            settings.RECIPE_LIST_CACHE_TIMEOUT,
+        )
+        return response
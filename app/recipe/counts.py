@@ -0,0 +1,47 @@
+"""
+Counts of the recipes using each tag and ingredient.
+
+`Tag.recipe_count` and `Ingredient.recipe_count` are kept up to date by
+the signal handlers in recipe.signals. Rather than incrementing them, the
+tags or ingredients affected by a change are recounted from the through
+table, after locking them. Under READ COMMITTED a recount only sees the
+changes committed when it starts, so the lock makes a concurrent change
+to the same tags wait for this one to commit before recounting, and the
+last recount sees both. Counts that drifted anyway, say through raw SQL,
+are repaired by the repair_recipe_counts command.
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe
+
+
+def update_recipe_counts(field, ids):
+    """
+    Recount the recipes of the tags or ingredients with ids.
+
+    Returns how many of the counts were wrong.
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        return 0
+
+    through = getattr(Recipe, field).through
+    column = through._meta.get_field(field[:-1]).attname
+    count = Coalesce(Subquery(
+        through.objects.filter(**{column: OuterRef('pk')}).values(
+            column,
+        ).annotate(count=Count('pk')).values('count')
+    ), Value(0))
+    model = Recipe._meta.get_field(field).related_model
+    with transaction.atomic(savepoint=False):
+        # Locked in a statement of their own, in a consistent order, as
+        # an UPDATE waiting for a lock still counts with its own snapshot.
+        list(model.objects.select_for_update().filter(
+            pk__in=ids,
+        ).order_by('pk').values_list('pk', flat=True))
+
+        return model.objects.filter(pk__in=ids).filter(
+            ~Q(recipe_count=count),
+        ).update(recipe_count=count)
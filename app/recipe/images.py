@@ -0,0 +1,182 @@
+"""
+Background processing of uploaded recipe images.
+
+The upload request only stores the original file. Decoding and resizing
+it into the variants listed in RECIPE_IMAGE_VARIANTS happens afterwards
+on a small thread pool, and the recipe's image_status reports progress.
+
+The queue of the pool is in the memory of the process that took the
+upload, and isn't durable: images queued or being processed when it
+stops are left pending or processing. The process_stuck_images command,
+which scripts/run.sh runs every few minutes, processes them.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connections, transaction
+from PIL import features, Image, ImageOps
+
+from core.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the worker pool, starting it in this process if needed."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-image',
+            )
+
+    return _executor
+
+
+def enqueue_image_processing(recipe_id):
+    """Process the recipe's image once the current transaction commits."""
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(_process_in_worker, recipe_id)
+        )
+    else:
+        transaction.on_commit(lambda: process_recipe_image(recipe_id))
+
+
+def _process_in_worker(recipe_id):
+    """
+    Process an image on a pool thread, which has its own connection.
+
+    The connection is closed afterwards whatever DB_CONN_MAX_AGE, rather
+    than held by an idle thread until the next upload.
+    """
+    close_old_connections()
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def get_formats():
+    """Return the formats variants are written in, with their extension."""
+    formats = [('jpeg', 'JPEG', '.jpg')]
+    if features.check('webp'):
+        formats.append(('webp', 'WEBP', '.webp'))
+    # Pillow only knows of AVIF from 11.2, and warns when asked before.
+    if 'avif' in features.modules and features.check_module('avif'):
+        formats.append(('avif', 'AVIF', '.avif'))
+
+    return formats
+
+
+def variant_names(variants):
+    """Return the storage names of every file in an image_variants map."""
+    return [
+        value
+        for variant in variants.values()
+        for key, value in variant.items()
+        if key not in ('width', 'height')
+    ]
+
+
+def render_variants(image_file, name):
+    """
+    Write the variants of an image to storage.
+
+    Returns a mapping of variant name to its width, height and the
+    storage name of each format. Variants that would come out the same
+    size as a smaller one, because the original is small, are skipped.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    stem = os.path.splitext(os.path.basename(name))[0]
+    directory = os.path.join('uploads', 'recipe', 'variants')
+
+    with Image.open(image_file) as original:
+        largest = max(settings.RECIPE_IMAGE_VARIANTS.values())
+        # Let JPEG decode at a reduced scale when that is enough.
+        original.draft('RGB', (largest, largest))
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            has_alpha = (
+                'A' in original.getbands() or
+                'transparency' in original.info
+            )
+            original = original.convert('RGBA' if has_alpha else 'RGB')
+
+        variants = {}
+        sizes = set()
+        for variant, size in sorted(
+            settings.RECIPE_IMAGE_VARIANTS.items(), key=lambda item: item[1]
+        ):
+            image = original.copy()
+            image.thumbnail((size, size))
+            if image.size in sizes:
+                continue
+            sizes.add(image.size)
+
+            width, height = image.size
+            variants[variant] = {'width': width, 'height': height}
+            for key, image_format, ext in get_formats():
+                output = image
+                if image_format == 'JPEG' and image.mode != 'RGB':
+                    output = image.convert('RGB')
+                data = io.BytesIO()
+                output.save(data, format=image_format, quality=85)
+                variants[variant][key] = storage.save(
+                    os.path.join(directory, f'{stem}_{variant}{ext}'),
+                    ContentFile(data.getvalue()),
+                )
+
+    return variants
+
+
+def process_recipe_image(recipe_id):
+    """Generate the variants of a recipe's image and record the outcome."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    name = recipe.image.name
+    # Recipes with the same image share the file, and so its variants.
+    processed = Recipe.objects.filter(
+        image=name,
+        image_status=Recipe.IMAGE_READY,
+    ).exclude(pk=recipe_id).values_list('image_variants', flat=True).first()
+    if processed is not None:
+        _set_status(recipe_id, name, Recipe.IMAGE_READY, processed)
+        return
+
+    _set_status(recipe_id, name, Recipe.IMAGE_PROCESSING)
+
+    try:
+        with recipe.image.open('rb') as image_file:
+            variants = render_variants(image_file, name)
+    except Exception:
+        logger.exception('Processing image %s of recipe %s failed.',
+                         name, recipe_id)
+        _set_status(recipe_id, name, Recipe.IMAGE_FAILED)
+    else:
+        _set_status(recipe_id, name, Recipe.IMAGE_READY, variants)
+
+
+def _set_status(recipe_id, name, status, variants=None):
+    """Record the status of an image, unless it has since been replaced."""
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id,
+            image=name,
+        ).first()
+        if recipe is None:
+            return
+
+        recipe.image_status = status
+        recipe.image_variants = variants or {}
+        recipe.save(update_fields=['image_status', 'image_variants'])
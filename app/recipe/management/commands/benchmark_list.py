@@ -0,0 +1,102 @@
+"""
+Django command to benchmark serializing pages of the recipe list.
+"""
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.bulk import import_recipes
+from recipe.listing import list_columns, list_fields, RecipeRows
+from recipe.serializers import RecipeSerializer
+
+EMAIL = 'benchmark-list@example.com'
+
+
+def recipe_lines(count):
+    """Yield JSON lines of count recipes with a few tags and ingredients."""
+    for i in range(count):
+        yield json.dumps({
+            'title': f'Recipe {i}',
+            'time_minutes': 5 + i % 120,
+            'price': f'{1 + i % 50}.50',
+            'link': f'https://example.com/recipes/{i}',
+            'tags': [{'name': f'Tag {(i + j) % 20}'} for j in range(2)],
+            'ingredients': [
+                {'name': f'Ingredient {(i + j) % 100}'} for j in range(4)
+            ],
+        })
+
+
+class Command(BaseCommand):
+    """Django command to time the list serializer against its fast path."""
+    help = (
+        'Time building and rendering pages of the recipe list with '
+        'RecipeSerializer and with the .values() fast path.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            nargs='+',
+            default=[1000, 10000],
+            help='Page sizes to time.',
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Number of times each page is timed; the best is kept.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for benchmarking the recipe list"""
+        user, _ = get_user_model().objects.get_or_create(email=EMAIL)
+        recipes = Recipe.objects.filter(user=user).order_by('-id')
+        try:
+            missing = max(options['pages']) - recipes.count()
+            if missing > 0:
+                self.stdout.write(f'Creating {missing} recipes...')
+                import_recipes(user, recipe_lines(missing))
+
+            request = Request(APIRequestFactory().get('/'))
+            for size in options['pages']:
+                page = recipes[:size]
+                serializer = self._time(options['runs'], lambda: JSONRenderer(
+                ).render(RecipeSerializer(page.prefetch_related(*(
+                    Prefetch(field, queryset=model.objects.order_by('id'))
+                    for field, model in (
+                        ('tags', Tag), ('ingredients', Ingredient),
+                    )
+                )), many=True, context={'request': request}).data))
+                rows = self._time(options['runs'], lambda: JSONRenderer(
+                ).render(RecipeRows(page.values(
+                    *list_columns(list_fields(request)),
+                ), context={'request': request}).data))
+
+                if serializer[1] != rows[1]:
+                    self.stderr.write(f'  {size}: the outputs differ!')
+                self.stdout.write(
+                    f'  {size:>6} recipes  serializer {serializer[0]:7.1f} ms'
+                    f'  rows {rows[0]:7.1f} ms'
+                    f'  {serializer[0] / rows[0]:4.1f}x faster'
+                )
+        finally:
+            get_user_model().objects.filter(pk=user.pk).delete()
+
+    def _time(self, runs, func):
+        """Return the best time of func in ms, and its result."""
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        return min(timings), result
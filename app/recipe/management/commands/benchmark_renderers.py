@@ -0,0 +1,88 @@
+"""
+Django command to benchmark rendering pages of the recipe list.
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Recipe
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+from recipe.bulk import import_recipes
+from recipe.listing import list_columns, list_fields, RecipeRows
+from recipe.management.commands.benchmark_list import recipe_lines
+
+EMAIL = 'benchmark-renderers@example.com'
+
+RENDERERS = (
+    ('json', JSONRenderer),
+    ('orjson', ORJSONRenderer),
+    ('msgpack', MessagePackRenderer),
+)
+
+
+class Command(BaseCommand):
+    """Django command to time the renderers on recipe lists."""
+    help = (
+        "Compare the size and encoding time of pages of the recipe list "
+        "with DRF's JSONRenderer, orjson and MessagePack."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000],
+            help='Page sizes to time.',
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=10,
+            help='Number of times each page is rendered; the best is kept.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for benchmarking the renderers"""
+        user, _ = get_user_model().objects.get_or_create(email=EMAIL)
+        recipes = Recipe.objects.filter(user=user).order_by('-id')
+        try:
+            missing = max(options['pages']) - recipes.count()
+            if missing > 0:
+                self.stdout.write(f'Creating {missing} recipes...')
+                import_recipes(user, recipe_lines(missing))
+
+            request = Request(APIRequestFactory().get('/'))
+            for size in options['pages']:
+                data = RecipeRows(recipes[:size].values(
+                    *list_columns(list_fields(request)),
+                ), context={'request': request}).data
+                self.stdout.write(f'{size} recipes')
+                baseline = None
+                for name, renderer_class in RENDERERS:
+                    renderer = renderer_class()
+                    seconds, content = self._time(
+                        options['runs'], lambda: renderer.render(data),
+                    )
+                    baseline = baseline or seconds
+                    self.stdout.write(
+                        f'  {name:<8} {len(content) / 1024:9.1f} KiB'
+                        f'  {seconds:8.2f} ms'
+                        f'  {baseline / seconds:5.1f}x'
+                    )
+        finally:
+            get_user_model().objects.filter(pk=user.pk).delete()
+
+    def _time(self, runs, func):
+        """Return the best time of func in ms, and its result."""
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        return min(timings), result
@@ -0,0 +1,234 @@
+"""
+Django command to benchmark recipe search on a generated fixture.
+"""
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import connection
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.counts import update_recipe_counts
+from recipe.search import search_recipes, update_search_vectors
+
+EMAIL = 'benchmark-search-{n}@example.com'
+
+ADJECTIVES = [
+    'baked', 'braised', 'charred', 'creamy', 'crispy', 'easy', 'fried',
+    'grilled', 'hearty', 'herby', 'honey', 'lemony', 'quick', 'roasted',
+    'rustic', 'smoky', 'spicy', 'sticky', 'sweet', 'tangy',
+]
+FOODS = [
+    'almond', 'apple', 'aubergine', 'bacon', 'bean', 'beef', 'beetroot',
+    'bread', 'broccoli', 'butter', 'cabbage', 'carrot', 'cauliflower',
+    'celery', 'cheese', 'cherry', 'chicken', 'chickpea', 'chili',
+    'chocolate', 'chorizo', 'coconut', 'cod', 'corn', 'courgette', 'crab',
+    'cucumber', 'duck', 'egg', 'fennel', 'feta', 'garlic', 'ginger',
+    'haddock', 'halloumi', 'ham', 'kale', 'lamb', 'leek', 'lentil', 'lime',
+    'mango', 'miso', 'mushroom', 'mussel', 'noodle', 'oat', 'olive',
+    'onion', 'orange', 'pasta', 'pea', 'peach', 'peanut', 'pear', 'pepper',
+    'pesto', 'pork', 'potato', 'prawn', 'pumpkin', 'quinoa', 'radish',
+    'rice', 'ricotta', 'salmon', 'sausage', 'sesame', 'spinach', 'squash',
+    'squid', 'steak', 'strawberry', 'tofu', 'tomato', 'trout', 'tuna',
+    'turkey', 'walnut', 'yoghurt',
+]
+DISHES = [
+    'bake', 'burger', 'cake', 'casserole', 'curry', 'dumplings', 'flatbread',
+    'fritters', 'gratin', 'hash', 'kebab', 'noodles', 'pie', 'pilaf',
+    'risotto', 'salad', 'skewers', 'soup', 'stew', 'stir-fry', 'tacos',
+    'tart', 'traybake', 'wraps',
+]
+TAGS = [
+    'vegan', 'vegetarian', 'gluten free', 'dinner', 'lunch', 'breakfast',
+    'party', 'weeknight',
+]
+TERMS = [
+    'halloumi',
+    'spicy chorizo',
+    'mushroom risotto',
+    '"garlic soup"',
+    'salmon -teriyaki',
+    'vegan curry',
+]
+
+
+class Command(BaseCommand):
+    """Django command to time ranked searches over many recipes."""
+    help = (
+        'Generate recipes for benchmark users and time ranked searches of '
+        "one user's recipes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=1_000_000,
+            help='Number of recipes in the fixture.',
+        )
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=100,
+            help='Number of users the recipes are spread over.',
+        )
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=20,
+            help='Number of times each search is timed.',
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Number of results fetched per search.',
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the fixture, and reuse a kept one if big enough.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for benchmarking search"""
+        users = [
+            get_user_model().objects.get_or_create(
+                email=EMAIL.format(n=n),
+            )[0]
+            for n in range(options['users'])
+        ]
+        recipes = Recipe.objects.filter(user__in=users)
+        try:
+            if recipes.count() < options['recipes']:
+                self._delete_fixture(users)
+                self._create_fixture(users, options['recipes'])
+            self.stdout.write(
+                f'{recipes.count()} recipes of {len(users)} users, '
+                f'{options["runs"]} runs per search, '
+                f'top {options["page_size"]} results'
+            )
+            # Searches are always of one user's recipes.
+            self._benchmark(
+                Recipe.objects.filter(user=users[0]),
+                options['runs'],
+                options['page_size'],
+            )
+        finally:
+            if not options['keep']:
+                self._delete_fixture(users)
+                get_user_model().objects.filter(
+                    pk__in=[user.pk for user in users],
+                ).delete()
+
+    def _create_fixture(self, users, count):
+        """Create count recipes with tags and ingredients for users."""
+        self.stdout.write(f'Creating {count} recipes...')
+        start = time.perf_counter()
+        user_ids = [user.pk for user in users]
+        Tag.objects.bulk_create([
+            Tag(user=user, name=name) for user in users for name in TAGS
+        ])
+        Ingredient.objects.bulk_create([
+            Ingredient(user=user, name=name)
+            for user in users for name in FOODS
+        ])
+        with connection.cursor() as cursor:
+            # Seeded, so every fixture of a size is the same.
+            cursor.execute('SELECT setseed(0.5)')
+            cursor.execute('''
+                INSERT INTO core_recipe (
+                    user_id, title, description, time_minutes, price, link,
+                    image_status, image_variants, version, updated_at
+                )
+                SELECT
+                    users[1 + i %% cardinality(users)],
+                    initcap(
+                        adj[1 + floor(random() * cardinality(adj))] || ' ' ||
+                        food[1 + floor(random() * cardinality(food))] || ' ' ||
+                        dish[1 + floor(random() * cardinality(dish))]
+                    ),
+                    'Serve with ' ||
+                        food[1 + floor(random() * cardinality(food))] ||
+                        ' and a little ' ||
+                        food[1 + floor(random() * cardinality(food))] || '.',
+                    5 + i %% 120,
+                    (100 + i %% 4900) / 100.0,
+                    '', '', '{}', 1, now()
+                FROM generate_series(1, %(count)s) AS i, (
+                    SELECT %(users)s::bigint[] AS users,
+                        %(adj)s::text[] AS adj,
+                        %(food)s::text[] AS food,
+                        %(dish)s::text[] AS dish
+                ) AS words
+            ''', {
+                'users': user_ids, 'count': count, 'adj': ADJECTIVES,
+                'food': FOODS, 'dish': DISHES,
+            })
+            # Two of the owner's tags and ingredients on every recipe.
+            for field, model in (('tags', Tag), ('ingredients', Ingredient)):
+                through = getattr(Recipe, field).through._meta.db_table
+                table = model._meta.db_table
+                column = f'{model._meta.model_name}_id'
+                cursor.execute(f'''
+                    INSERT INTO {through} (recipe_id, {column})
+                    SELECT r.id, picked.id
+                    FROM core_recipe r, LATERAL (
+                        SELECT id FROM {table} related
+                        WHERE related.user_id = r.user_id
+                        -- Random per recipe, where random() would be
+                        -- memoized per user.
+                        ORDER BY md5(r.id || '-' || related.id) LIMIT 2
+                    ) AS picked
+                    WHERE r.user_id = ANY(%s)
+                ''', [user_ids])
+
+        update_search_vectors(Recipe.objects.filter(user_id__in=user_ids))
+        for field, model in (('tags', Tag), ('ingredients', Ingredient)):
+            update_recipe_counts(field, model.objects.filter(
+                user_id__in=user_ids,
+            ).values_list('pk', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_recipe')
+        self.stdout.write(f'  took {time.perf_counter() - start:.1f}s')
+
+    def _delete_fixture(self, users):
+        """Delete the fixture with set based deletes."""
+        user_ids = [user.pk for user in users]
+        with connection.cursor() as cursor:
+            for field in ('tags', 'ingredients'):
+                through = getattr(Recipe, field).through._meta.db_table
+                cursor.execute(f'''
+                    DELETE FROM {through} WHERE recipe_id IN (
+                        SELECT id FROM core_recipe WHERE user_id = ANY(%s)
+                    )
+                ''', [user_ids])
+            for model in (Recipe, Tag, Ingredient):
+                cursor.execute(
+                    f'DELETE FROM {model._meta.db_table} '
+                    'WHERE user_id = ANY(%s)',
+                    [user_ids],
+                )
+
+    def _benchmark(self, recipes, runs, page_size):
+        """Time each search term and report the latency percentiles."""
+        for terms in TERMS:
+            queryset = search_recipes(recipes, terms)
+            page = queryset.order_by('-rank', '-id').values_list(
+                'id', flat=True,
+            )[:page_size]
+            plan = page.explain()
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                list(page.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+            index = 'GIN' if 'recipe_search_idx' in plan else 'no index'
+            self.stdout.write(
+                f'  {terms:<20} {queryset.count():>8} matches  '
+                f'p50 {statistics.median(timings):6.1f} ms  '
+                f'p95 {p95:6.1f} ms  ({index})'
+            )
@@ -0,0 +1,150 @@
+"""
+Django command to benchmark the memory used by concurrent image uploads.
+"""
+import math
+import os
+import resource
+import shutil
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management import BaseCommand
+from PIL import Image
+from rest_framework import serializers
+
+from recipe.serializers import StreamedImageField
+from recipe.uploads import get_storage, StreamingImageUploadHandler
+
+BOUNDARY = 'BenchmarkBoundary'
+
+
+def write_body(path, size_mb):
+    """Write a multipart body holding an incompressible PNG."""
+    side = int(math.sqrt(size_mb * 10 ** 6 / 3))
+    image = Image.frombytes(
+        'RGB', (side, side), os.urandom(side * side * 3)
+    )
+    with open(path, 'wb') as body:
+        body.write((
+            f'--{BOUNDARY}\r\n'
+            'Content-Disposition: form-data; name="image"; '
+            'filename="benchmark.png"\r\n'
+            'Content-Type: image/png\r\n\r\n'
+        ).encode())
+        image.save(body, format='PNG', compress_level=1)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+
+
+class Command(BaseCommand):
+    """Django command to report peak memory of parallel image uploads."""
+    help = (
+        'Benchmark parsing and storing concurrent multipart image uploads. '
+        'Run once per --handler, since peak RSS is per process.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--handler',
+            choices=['streaming', 'default'],
+            default='streaming',
+            help='Upload the image with the streaming handler, or with '
+                 "Django's default handlers and ImageField validation.",
+        )
+        parser.add_argument(
+            '--uploads',
+            type=int,
+            default=20,
+            help='Number of concurrent uploads.',
+        )
+        parser.add_argument(
+            '--size-mb',
+            type=float,
+            default=10,
+            help='Approximate size of the uploaded image in MB.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for benchmarking image uploads"""
+        directory = tempfile.mkdtemp()
+        try:
+            body = os.path.join(directory, 'body')
+            # Built in another process so it doesn't count towards RSS.
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                pool.submit(write_body, body, options['size_mb']).result()
+            self.stdout.write(
+                f'{options["uploads"]} concurrent uploads of '
+                f'{os.path.getsize(body) / 10 ** 6:.1f} MB '
+                f'with the {options["handler"]} handler'
+            )
+            upload = getattr(self, f'_upload_{options["handler"]}')
+
+            rss_before = self._max_rss()
+            tracemalloc.start()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['uploads']) as pool:
+                names = list(pool.map(
+                    lambda _: upload(self._request(body)),
+                    range(options['uploads']),
+                ))
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            rss_after = self._max_rss()
+        finally:
+            shutil.rmtree(directory)
+
+        storage = get_storage()
+        for name in names:
+            storage.delete(name)
+
+        self.stdout.write(f'  elapsed: {elapsed:.2f}s')
+        self.stdout.write(
+            f'  peak Python allocations: {peak / 2 ** 20:.1f} MiB'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'  peak RSS growth: {(rss_after - rss_before) / 2 ** 20:.1f} MiB'
+        ))
+
+    def _request(self, body):
+        """Return a request reading the multipart body from disk."""
+        return WSGIRequest({
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+            'CONTENT_LENGTH': str(os.path.getsize(body)),
+            'wsgi.input': open(body, 'rb'),
+            'wsgi.url_scheme': 'http',
+        })
+
+    def _upload_streaming(self, request):
+        """Stream the image to storage, returning its name."""
+        request.upload_handlers.insert(
+            0, StreamingImageUploadHandler(request)
+        )
+        try:
+            return StreamedImageField().to_internal_value(
+                request.FILES['image']
+            )
+        finally:
+            request.environ['wsgi.input'].close()
+
+    def _upload_default(self, request):
+        """Upload the image as before streaming, returning its name."""
+        try:
+            image = serializers.ImageField().to_internal_value(
+                request.FILES['image']
+            )
+            return get_storage().save('uploads/recipe/benchmark.png', image)
+        finally:
+            request.environ['wsgi.input'].close()
+            for upload in request.FILES.values():
+                upload.close()
+
+    def _max_rss(self):
+        """Return the peak resident set size of the process in bytes."""
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
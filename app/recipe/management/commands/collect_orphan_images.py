@@ -0,0 +1,90 @@
+"""
+Django command to delete recipe images no recipe refers to any more.
+"""
+import os
+import time
+
+from django.core.management import BaseCommand
+from django.db.models import Count
+
+from core.models import Recipe
+from recipe.images import variant_names
+from recipe.uploads import get_storage
+
+UPLOAD_DIR = os.path.join('uploads', 'recipe')
+
+
+class Command(BaseCommand):
+    """Django command to garbage collect unreferenced recipe images."""
+    help = (
+        'Delete recipe images and variants that no recipe refers to, and '
+        'abandoned partial uploads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=3600,
+            help='Only delete files unused for this many seconds, so '
+                 'uploads not yet saved to their recipe are kept.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the files that would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for collecting orphan images"""
+        storage = get_storage()
+        cutoff = time.time() - options['grace']
+        # Read before listing the files, so a file saved in between is
+        # either referenced or too new to delete.
+        referenced = self._references(options['verbosity'])
+
+        deleted = 0
+        size = 0
+        for directory, _, files in os.walk(storage.path(UPLOAD_DIR)):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, storage.location)
+                if name in referenced:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > cutoff:
+                    continue
+
+                if options['verbosity'] > 1 or options['dry_run']:
+                    self.stdout.write(name)
+                if not options['dry_run']:
+                    storage.delete(name)
+                deleted += 1
+                size += stat.st_size
+
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {deleted} files ({size / 2 ** 20:.1f} MiB), '
+            f'{len(referenced)} files referenced.'
+        ))
+
+    def _references(self, verbosity):
+        """Return the number of recipes referring to each stored file."""
+        references = {}
+        images = Recipe.objects.exclude(image='').exclude(
+            image__isnull=True,
+        ).values('image', 'image_variants').annotate(recipes=Count('id'))
+        for row in images.iterator():
+            count = row['recipes']
+            names = [row['image'], *variant_names(row['image_variants'])]
+            for name in names:
+                references[name] = references.get(name, 0) + count
+
+        if verbosity > 1:
+            shared = sum(count > 1 for count in references.values())
+            self.stdout.write(f'{shared} files shared by several recipes.')
+
+        return references
@@ -0,0 +1,65 @@
+"""
+Django command to export recipes to a JSON Lines file.
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe.bulk import BATCH_SIZE, EXPORT_FORMATS, export_recipes
+
+
+class Command(BaseCommand):
+    """Django command to write a user's recipes to a file."""
+    help = 'Export the recipes of a user as JSON Lines, JSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Email of the user whose recipes are exported.',
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write to, instead of standard output.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=list(EXPORT_FORMATS),
+            default='ndjson',
+            help='Format to write the recipes in.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Recipes read from the cursor per batch.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for exporting recipes"""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["user"]}.')
+
+        queryset = Recipe.objects.filter(user=user)
+        chunks = export_recipes(
+            queryset, options['format'], options['batch_size']
+        )
+        start = time.perf_counter()
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+        seconds = time.perf_counter() - start
+        count = queryset.count()
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {count} recipes in {seconds:.2f}s '
+            f'({count / seconds if seconds else 0:.0f} rows/sec).'
+        ))
@@ -0,0 +1,55 @@
+"""
+Django command to import recipes from a JSON Lines file.
+"""
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from recipe.bulk import BATCH_SIZE, import_recipes
+
+
+class Command(BaseCommand):
+    """Django command to bulk create a user's recipes."""
+    help = 'Import recipes, one JSON object per line, for a user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='JSON Lines file to read, or - for standard input.',
+        )
+        parser.add_argument(
+            '--user',
+            required=True,
+            help='Email of the user the recipes are created for.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Recipes validated and inserted per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for importing recipes"""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["user"]}.')
+
+        if options['path'] == '-':
+            result = import_recipes(user, sys.stdin, options['batch_size'])
+        else:
+            with open(options['path'], 'rb') as lines:
+                result = import_recipes(user, lines, options['batch_size'])
+
+        for error in result.errors:
+            self.stderr.write(
+                f'Line {error["line"]}: {json.dumps(error["errors"])}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} recipes, skipped {result.invalid} '
+            f'invalid lines in {result.seconds:.2f}s '
+            f'({result.rows_per_second:.0f} rows/sec).'
+        ))
@@ -0,0 +1,52 @@
+"""
+Django command to process recipe images whose processing was lost.
+"""
+from datetime import timedelta
+
+from django.core.management import BaseCommand
+from django.utils import timezone
+
+from core.models import Recipe
+from recipe.images import process_recipe_image
+
+STUCK_STATUSES = (Recipe.IMAGE_PENDING, Recipe.IMAGE_PROCESSING)
+
+
+class Command(BaseCommand):
+    """Django command to process images stuck pending or processing."""
+    help = (
+        'Process the recipe images left pending or processing for longer '
+        'than the timeout, as the process they were queued in stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=600,
+            help='Seconds since a recipe last changed after which its '
+                 'image is taken as lost.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for processing stuck images"""
+        cutoff = timezone.now() - timedelta(seconds=options['timeout'])
+        stuck = Recipe.objects.filter(
+            image_status__in=STUCK_STATUSES,
+            updated_at__lt=cutoff,
+        )
+
+        processed = 0
+        for recipe_id in stuck.values_list('pk', flat=True):
+            # Claimed by touching it, so that commands running at once
+            # elsewhere leave it to this one.
+            if not stuck.filter(pk=recipe_id).update(
+                updated_at=timezone.now(),
+            ):
+                continue
+            process_recipe_image(recipe_id)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} stuck images.'
+        ))
@@ -0,0 +1,39 @@
+"""
+Django command to recount the recipes of every tag and ingredient.
+"""
+from django.core.management import BaseCommand
+
+from core.models import Ingredient, Tag
+from recipe.counts import update_recipe_counts
+
+
+class Command(BaseCommand):
+    """Django command to repair the recipe counts of tags and ingredients."""
+    help = (
+        'Recount the recipes of every tag and ingredient, and fix the '
+        'counts that drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Tags or ingredients recounted, and locked, per '
+                 'transaction.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for repairing recipe counts"""
+        batch_size = options['batch_size']
+        for field, model in (('tags', Tag), ('ingredients', Ingredient)):
+            ids = list(model.objects.order_by('pk').values_list(
+                'pk', flat=True,
+            ))
+            repaired = sum(
+                update_recipe_counts(field, ids[start:start + batch_size])
+                for start in range(0, len(ids), batch_size)
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Repaired {repaired} of {len(ids)} {field} counts.'
+            ))
@@ -0,0 +1,143 @@
+"""Pagination for the recipe APIs."""
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+def seek_after(ordering, values):
+    """
+    Return the condition of the rows following values in ordering.
+
+    It is the row comparison `(a, b) > (x, y)` spelled out, so that it can
+    mix directions, led by `a >= x` which an index on (a, b) can start its
+    scan at.
+    """
+    fields = [field.lstrip('-') for field in ordering]
+    lookups = ['lt' if field.startswith('-') else 'gt' for field in ordering]
+    following = reduce(or_, (
+        Q(**{f'{field}__{lookup}': value}, **dict(zip(fields[:i], values)))
+        for i, (field, lookup, value)
+        in enumerate(zip(fields, lookups, values))
+    ))
+
+    return Q(**{f'{fields[0]}__{lookups[0]}e': values[0]}) & following
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Opt-in keyset (cursor) pagination.
+
+    Pages seek on the view ordering (e.g. `id < cursor`) instead of using
+    OFFSET, so deep pages cost the same as the first one. Clients that send
+    neither `cursor` nor `page_size` keep getting the unpaginated list.
+
+    The cursor holds the values of every field of the ordering, which
+    ends in a unique field, so pages seek past any number of ties.
+    """
+    page_size = settings.RECIPE_PAGE_SIZE
+    max_page_size = settings.RECIPE_MAX_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    ordering = '-id'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Paginate only when the client asks for a page."""
+        params = request.query_params
+        if (self.cursor_query_param not in params and
+                self.page_size_query_param not in params):
+            return None
+
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+        ordering = _reverse_ordering(self.ordering) if reverse else (
+            self.ordering
+        )
+        if position is not None:
+            values = self._decode_position(position, queryset)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(seek_after(ordering, values))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None or offset > 0
+            self.has_previous = following is not None
+            self.next_position = position
+            self.previous_position = following
+        else:
+            self.has_next = following is not None
+            self.has_previous = position is not None or offset > 0
+            self.next_position = following
+            self.previous_position = position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _decode_position(self, position, queryset):
+        """Return the values of the ordering fields in a cursor position."""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(values, list) or
+            len(values) != len(self.ordering) or
+            not all(isinstance(value, str) for value in values)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+        try:
+            return [
+                field.to_python(value) for field, value
+                in zip(self._ordering_fields(queryset), values)
+            ]
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+
+    def _ordering_fields(self, queryset):
+        """Return the model fields, or annotations' fields, ordered by."""
+        annotations = queryset.query.annotations
+        return [
+            annotations[name].output_field if name in annotations
+            else queryset.model._meta.get_field(name)
+            for name in (field.lstrip('-') for field in self.ordering)
+        ]
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Return the values of all the ordering fields, as a JSON list."""
+        values = [
+            instance[field] if isinstance(instance, dict)
+            else getattr(instance, field)
+            for field in (field.lstrip('-') for field in ordering)
+        ]
+
+        return json.dumps([str(value) for value in values])
+
+    def get_ordering(self, request, queryset, view):
+        """Seek on the ordering of the view."""
+        if hasattr(view, 'get_ordering'):
+            ordering = view.get_ordering()
+        else:
+            ordering = getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+
+        return tuple(ordering)
@@ -0,0 +1,48 @@
+"""
+Renderers for the recipe export formats.
+
+The export streams its own encoding of the recipes; these renderers let
+content negotiation pick the format, and render anything else the
+action responds with, such as errors, in the same format.
+"""
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render a list as JSON Lines, one item per line."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+
+        return ''.join(json.dumps(item) + '\n' for item in data).encode()
+
+
+class CSVRenderer(BaseRenderer):
+    """Render a list of flat dicts as CSV with a header row."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if not isinstance(data, list):
+            data = [data]
+
+        output = io.StringIO()
+        columns = list(dict.fromkeys(key for row in data for key in row))
+        writer = csv.DictWriter(output, columns)
+        writer.writeheader()
+        writer.writerows(data)
+
+        return output.getvalue().encode(self.charset)
@@ -0,0 +1,55 @@
+"""
+Reading the recipe APIs from the database replicas.
+
+Lists and details can be a moment out of date, except to a user who has
+just changed their recipes, tags or ingredients and expects to see the
+change. Their cache version (see recipe.cache) is the time of their last
+change, so it tells whether they did so within DB_REPLICA_PIN_SECONDS,
+in which case they keep reading from the primary.
+"""
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+
+from core.routers import replica_reads
+from recipe.cache import caching_enabled, get_user_version
+
+
+def changed_recently(user_id):
+    """
+    Return whether the user changed their data in the pinned window.
+
+    Without a shared cache of the versions, a change made through another
+    worker can't be known, so every user is taken to have changed theirs.
+    """
+    if not caching_enabled():
+        return True
+
+    since = time.time_ns() - get_user_version(user_id)
+
+    return since < settings.DB_REPLICA_PIN_SECONDS * 1_000_000_000
+
+
+class ReplicaReadMixin:
+    """Serve the safe list and retrieve requests from a replica."""
+
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._replica_reads = ExitStack()
+        if (
+            settings.DATABASE_REPLICAS and
+            self.action in self.replica_actions and
+            request.method in SAFE_METHODS and
+            not changed_recently(request.user.pk)
+        ):
+            self._replica_reads.enter_context(replica_reads())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if hasattr(self, '_replica_reads'):
+            self._replica_reads.close()
+
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,176 @@
+"""
+Full-text search of recipes.
+
+Every recipe keeps a tsvector of its title, tag and ingredient names and
+description in `Recipe.search_vector`, weighted in that order and indexed
+with GIN. The signal handlers in recipe.signals recompute it when any of
+those change, once the transaction commits, with one UPDATE however many
+recipes are affected and however many times. Ordinary saves of a recipe
+leave it alone, and it is only written when it changed, as every write of
+an indexed column is a new row version the indexes have to point to.
+
+Tag and ingredient names are suggested as they are typed from trigram
+GIN indexes, so a suggestion costs the same however many names a user
+has.
+"""
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import transaction
+from django.db.models import (
+    BooleanField,
+    F,
+    FloatField,
+    Func,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Cast, Coalesce
+
+from core.models import Recipe
+from recipe.cache import bump_user_version, caching_enabled
+
+
+def _related_names(field):
+    """Return an expression of the names of a recipe's tags or ingredients."""
+    through = getattr(Recipe, field).through
+    names = through.objects.filter(recipe=OuterRef('pk')).values(
+        'recipe',
+    ).annotate(
+        names=StringAgg(f'{field[:-1]}__name', ' '),
+    ).values('names')
+
+    return Coalesce(Subquery(names), Value(''))
+
+
+def search_vector():
+    """Return the expression of a recipe's search vector."""
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (
+        SearchVector('title', weight='A', config=config) +
+        SearchVector(
+            _related_names('tags'),
+            _related_names('ingredients'),
+            weight='B',
+            config=config,
+        ) +
+        SearchVector('description', weight='C', config=config)
+    )
+
+
+class _IsDistinctFrom(Func):
+    """Inequality that takes NULL for a value like any other."""
+    arg_joiner = ' IS DISTINCT FROM '
+    template = '%(expressions)s'
+    output_field = BooleanField()
+
+
+def update_search_vectors(recipes):
+    """
+    Recompute the search vector of every recipe in the queryset.
+
+    Returns how many of the vectors changed.
+    """
+    vector = search_vector()
+    return recipes.filter(
+        _IsDistinctFrom(F('search_vector'), vector),
+    ).update(search_vector=vector)
+
+
+class _SearchVectorsUpdate:
+    """Recomputation of search vectors waiting for a commit."""
+
+    def __init__(self):
+        self.recipe_ids = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        recipes = Recipe.objects.filter(pk__in=self.recipe_ids)
+        if update_search_vectors(recipes) and caching_enabled():
+            # The owners' lists were invalidated on commit, perhaps before
+            # this, and so perhaps cached again with the old vectors.
+            user_ids = recipes.values_list('user_id', flat=True).distinct()
+            for user_id in user_ids:
+                bump_user_version(user_id)
+
+
+def update_search_vectors_on_commit(recipe_ids):
+    """
+    Recompute the search vectors of the recipes once the current
+    transaction commits.
+
+    Every recipe changed in a transaction is recomputed by the same
+    UPDATE, once.
+    """
+    connection = transaction.get_connection()
+    update = next((
+        func for sids, func, *_ in connection.run_on_commit
+        if isinstance(func, _SearchVectorsUpdate) and not func.done
+    ), None)
+    if update is None:
+        update = _SearchVectorsUpdate()
+        # Outside a transaction it runs at once, so the ids go in first.
+        update.recipe_ids.update(recipe_ids)
+        transaction.on_commit(update)
+    else:
+        update.recipe_ids.update(recipe_ids)
+
+
+def search_recipes(queryset, terms):
+    """
+    Filter the queryset to recipes matching terms, annotated with rank.
+
+    Terms use web search syntax: quoted phrases, `or` and `-excluded`.
+    The rank is cast to double precision, which reads back exactly, so
+    that pages can seek past the rank of the last recipe of a page.
+    """
+    query = SearchQuery(
+        terms,
+        search_type='websearch',
+        config=settings.RECIPE_SEARCH_CONFIG,
+    )
+
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField()),
+    )
+
+
+class _ILike(Func):
+    """Case insensitive LIKE, which trigram indexes can serve."""
+    arg_joiner = ' ILIKE '
+    template = '%(expressions)s'
+    output_field = BooleanField()
+
+
+def _like_escape(value):
+    """Escape the LIKE wildcards in value."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def suggest_names(queryset, prefix, limit):
+    """
+    Return the ids and names in queryset best completing prefix.
+
+    Names containing prefix are matched, and so are names similar to it,
+    to allow for typos. Names starting with prefix come first, then the
+    most similar ones.
+    """
+    escaped = _like_escape(prefix)
+
+    return queryset.filter(
+        Q(_ILike(F('name'), Value(f'%{escaped}%'))) |
+        Q(name__trigram_similar=prefix)
+    ).annotate(
+        starts_with=_ILike(F('name'), Value(f'{escaped}%')),
+        similarity=TrigramSimilarity('name', prefix),
+    ).order_by(
+        '-starts_with', '-similarity', 'name',
+    ).values('id', 'name')[:limit]
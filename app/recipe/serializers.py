@@ -1,64 +1,213 @@
 """Serializer for the recipe APIs."""
 
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 
 from core.models import (
     Recipe,
     Tag, 
     Ingredient
 )
+from recipe.uploads import StreamedImage
 
-class IngredientSerializer(serializers.ModelSerializer):
+
+def get_or_create_named(model, user, names):
+    """
+    Return the user's tags or ingredients by name, creating missing ones.
+
+    Names are resolved with one query and the missing ones created with
+    one bulk insert and read back, however many names there are.
+    """
+    if not names:
+        return {}
+
+    objs = {
+        obj.name: obj for obj in model.objects.filter(
+            user=user,
+            name__in=names,
+        )
+    }
+    missing = [model(user=user, name=name) for name in names
+               if name not in objs]
+    if missing:
+        # Names created concurrently by another request are skipped
+        # here and picked up by the lookup below.
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        objs.update(
+            (obj.name, obj) for obj in model.objects.filter(
+                user=user,
+                name__in=[obj.name for obj in missing],
+            )
+        )
+
+    return objs
+
+
+def sparse_fields(request, names):
+    """
+    Return which of the field names a read asks for, if not all of them.
+
+    Reads can list the fields they want in a comma separated `fields`
+    query parameter, or the ones they don't in `exclude`. Returns None
+    when every field is wanted.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+
+    params = request.query_params
+    if 'fields' in params and 'exclude' in params:
+        raise serializers.ValidationError(
+            {'fields': 'Give either fields or exclude, not both.'}
+        )
+    for param in ('fields', 'exclude'):
+        if param not in params:
+            continue
+        asked = {name.strip() for name in params[param].split(',')} - {''}
+        unknown = asked - set(names)
+        if unknown:
+            raise serializers.ValidationError(
+                {param: f'Unknown fields: {", ".join(sorted(unknown))}.'}
+            )
+        wanted = (param == 'fields')
+        return [name for name in names if (name in asked) == wanted]
+
+    return None
+
+
+class SparseFieldsMixin:
+    """
+    Narrow a serializer to the fields the request asks for.
+
+    Only the serializer of the response is narrowed, not the serializers
+    nested in it. See sparse_fields().
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return fields
+
+        names = sparse_fields(self.context.get('request'), list(fields))
+        if names is not None:
+            fields = {name: fields[name] for name in names}
+
+        return fields
+
+
+def variant_url(name, request=None):
+    """Return the URL of an image variant, absolute given a request."""
+    url = Recipe._meta.get_field('image').storage.url(name)
+    if request is not None:
+        return request.build_absolute_uri(url)
+
+    return url
+
+
+def image_srcset(variants, request=None):
+    """Return a srcset of the image variants for each format."""
+    srcset = {}
+    for variant in sorted(variants.values(), key=lambda v: v['width']):
+        for key, name in variant.items():
+            if key in ('width', 'height'):
+                continue
+            srcset.setdefault(key, []).append(
+                f'{variant_url(name, request)} {variant["width"]}w'
+            )
+
+    return {key: ', '.join(urls) for key, urls in srcset.items()}
+
+
+class RecipeAttrSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    """Base serializer for recipe attributes named once per user."""
+
+    def get_fields(self):
+        """Leave the number of recipes out when nested in a recipe."""
+        fields = super().get_fields()
+        # Nested, the parent is the list of a recipe's tags or ingredients.
+        if isinstance(getattr(self.parent, 'parent', None), RecipeSerializer):
+            fields.pop('recipe_count', None)
+
+        return fields
+
+    def validate_name(self, value):
+        """Reject renaming to a name the user already has."""
+        request = self.context.get('request')
+        # Nested in a recipe, names are matched to existing objects instead.
+        if self.parent is not None or request is None:
+            return value
+
+        others = self.Meta.model.objects.filter(user=request.user, name=value)
+        if self.instance is not None:
+            others = others.exclude(pk=self.instance.pk)
+        if others.exists():
+            raise serializers.ValidationError(
+                f'{self.Meta.model._meta.verbose_name} already exists.'
+            )
+
+        return value
+
+
+class IngredientSerializer(RecipeAttrSerializer):
     """Serializer for ingredients in the recipe API."""
     class Meta:
         model = Ingredient
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(RecipeAttrSerializer):
     """Serializer for the tag object."""
     class Meta:
         model = Tag
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+        fields = ['id', 'name', 'recipe_count']
+        read_only_fields = ['id', 'recipe_count']
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for the recipe object."""
 
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = [
             'id', 'title', 'time_minutes', 'price', 'link', 'tags',
-            'ingredients'
+            'ingredients', 'image_srcset'
         ]
         read_only_fields = ['id']
 
+    def _variant_url(self, name):
+        """Return the URL of an image variant."""
+        return variant_url(name, self.context.get('request'))
+
+    def get_image_srcset(self, recipe) -> dict:
+        """Return a srcset of the image variants for each format."""
+        return image_srcset(recipe.image_variants, self.context.get('request'))
+
+    def _get_or_create_objects(self, model, items):
+        """Return the objects named by items, creating the missing ones."""
+        names = list(dict.fromkeys(item['name'] for item in items))
+        objs = get_or_create_named(model, self.context['request'].user, names)
+
+        return [objs[name] for name in names]
+
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags."""
-        
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user = auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
-
+        tag_objs = self._get_or_create_objects(Tag, tags)
+        if tag_objs:
+            recipe.tags.add(*tag_objs)
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed."""
+        ingredient_objs = self._get_or_create_objects(Ingredient, ingredients)
+        if ingredient_objs:
+            recipe.ingredients.add(*ingredient_objs)
 
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
-
+    @transaction.atomic
     def create(self, validated_data):
         """Create and return a new recipe."""
 
@@ -70,39 +219,76 @@ class RecipeSerializer(serializers.ModelSerializer):
         return recipe
     
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update recipe."""
 
         tags = validated_data.pop('tags', None)
-        ingredients = validated_data.pop('ingredients', [])
+        ingredients = validated_data.pop('ingredients', None)
 
+        # set() only inserts and deletes the through rows that changed.
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_objects(Tag, tags))
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_objects(Ingredient, ingredients)
+            )
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
-        instance.save()
+        # Changes to the relations already bumped the version, so only
+        # save the fields given, if any.
+        if validated_data or (tags is None and ingredients is None):
+            instance.save(update_fields=list(validated_data))
         return instance
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for the recipe detail object."""
 
+    image_variants = serializers.SerializerMethodField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_status', 'image_variants'
+        ]
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + [
+            'image_status'
+        ]
+
+    def get_image_variants(self, recipe) -> dict:
+        """Return the size and URL of each format of each image variant."""
+        return {
+            variant: {
+                key: value if key in ('width', 'height')
+                else self._variant_url(value)
+                for key, value in files.items()
+            }
+            for variant, files in recipe.image_variants.items()
+        }
+
+
+class StreamedImageField(serializers.ImageField):
+    """Image field for images already streamed to storage on upload."""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, StreamedImage):
+            self.fail('invalid')
+        if data.error:
+            raise serializers.ValidationError(data.error)
+
+        return data.name
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images to the recipe object."""
 
+    image = StreamedImageField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'image_status']
+        read_only_fields = ['id', 'image_status']
         extra_kwargs = {
             'image': {'required': True}
         }
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""Signal handlers for the recipe APIs."""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import bump_user_version_on_commit
+from recipe.counts import update_recipe_counts
+from recipe.search import update_search_vectors_on_commit
+
+# Fields of a recipe that are part of its search vector.
+SEARCHED_FIELDS = {'title', 'description'}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_user_lists(sender, instance, **kwargs):
+    """Invalidate the cached lists of the owner of a changed object."""
+    bump_user_version_on_commit(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_user_lists_on_m2m(sender, instance, action, **kwargs):
+    """Invalidate the owner's cached lists when recipe relations change."""
+    if action.startswith('post_'):
+        bump_user_version_on_commit(instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_vector(sender, instance, created, update_fields, **kwargs):
+    """Update a recipe's search vector if its text may have changed."""
+    if update_fields is None or SEARCHED_FIELDS & set(update_fields):
+        update_search_vectors_on_commit([instance.pk])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_search_vector_on_m2m(
+    sender, instance, action, reverse, model, pk_set, **kwargs
+):
+    """Update the search vectors of recipes whose relations changed."""
+    field = 'tags' if sender is Recipe.tags.through else 'ingredients'
+    if not reverse:
+        if action.startswith('post_'):
+            update_search_vectors_on_commit([instance.pk])
+    elif action == 'pre_clear':
+        instance._search_recipe_ids = list(Recipe.objects.filter(
+            **{field: instance}
+        ).values_list('pk', flat=True))
+    elif action == 'post_clear':
+        update_search_vectors_on_commit(
+            instance.__dict__.pop('_search_recipe_ids', [])
+        )
+    elif action in ('post_add', 'post_remove') and pk_set:
+        update_search_vectors_on_commit(pk_set)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def update_search_vector_on_rename(sender, instance, created, **kwargs):
+    """Update the search vectors of recipes using a changed name."""
+    if not created:
+        field = 'tags' if sender is Tag else 'ingredients'
+        update_search_vectors_on_commit(Recipe.objects.filter(
+            **{field: instance}
+        ).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def remember_searched_recipes(sender, instance, **kwargs):
+    """Note the recipes using an object about to be deleted."""
+    field = 'tags' if sender is Tag else 'ingredients'
+    instance._search_recipe_ids = list(Recipe.objects.filter(
+        **{field: instance}
+    ).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def update_search_vector_on_delete(sender, instance, **kwargs):
+    """Drop a deleted name from the search vectors of its recipes."""
+    recipe_ids = instance.__dict__.pop('_search_recipe_ids', [])
+    if recipe_ids:
+        update_search_vectors_on_commit(recipe_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts_on_m2m(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Recount the recipes of tags or ingredients added or removed."""
+    field = 'tags' if sender is Recipe.tags.through else 'ingredients'
+    if reverse:
+        if action.startswith('post_'):
+            update_recipe_counts(field, [instance.pk])
+    elif action == 'pre_clear':
+        instance.__dict__.setdefault('_counted_ids', {})[field] = list(
+            getattr(instance, field).values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        update_recipe_counts(
+            field, instance.__dict__.get('_counted_ids', {}).pop(field, [])
+        )
+    elif action in ('post_add', 'post_remove') and pk_set:
+        update_recipe_counts(field, pk_set)
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_counted_objects(sender, instance, **kwargs):
+    """Note the tags and ingredients of a recipe about to be deleted."""
+    instance._counted_ids = {
+        field: list(getattr(instance, field).values_list('pk', flat=True))
+        for field in ('tags', 'ingredients')
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def update_recipe_counts_on_delete(sender, instance, **kwargs):
+    """Recount the recipes of a deleted recipe's tags and ingredients."""
+    for field, ids in instance.__dict__.pop('_counted_ids', {}).items():
+        update_recipe_counts(field, ids)
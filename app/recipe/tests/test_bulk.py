@@ -0,0 +1,391 @@
+"""
+Test bulk import and export of recipes as JSON Lines.
+"""
+import csv
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.bulk import export_recipes, import_recipes
+
+IMPORT_URL = reverse('recipe:recipe-bulk-import')
+EXPORT_URL = reverse('recipe:recipe-bulk-export')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def recipe_line(title='Sample recipe', **params):
+    """Return a JSON line of a recipe."""
+    data = {
+        'title': title,
+        'time_minutes': 10,
+        'price': '5.00',
+    }
+    data.update(params)
+    return json.dumps(data) + '\n'
+
+
+def export_lines(user):
+    """Return the exported recipes of the user."""
+    chunks = export_recipes(Recipe.objects.filter(user=user))
+    return [json.loads(line) for line in ''.join(chunks).splitlines()]
+
+
+class BulkImportTests(TestCase):
+    """Test importing recipes."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _import(self, body):
+        return self.client.generic(
+            'POST', IMPORT_URL, body, content_type='application/x-ndjson'
+        )
+
+    def test_import_recipes(self):
+        """Test recipes are created with their tags and ingredients."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        body = recipe_line(
+            'Curry',
+            tags=[{'name': 'Vegan'}, {'name': 'Dinner'}],
+            ingredients=[{'name': 'Rice'}],
+        ) + '\n' + recipe_line('Salad', tags=[{'name': 'Vegan'}])
+
+        res = self._import(body)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 2)
+        curry = Recipe.objects.get(user=self.user, title='Curry')
+        self.assertEqual(
+            sorted(curry.tags.values_list('name', flat=True)),
+            ['Dinner', 'Vegan'],
+        )
+        self.assertEqual(
+            list(curry.ingredients.values_list('name', flat=True)), ['Rice']
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            Tag.objects.get(user=self.user, name='Vegan').recipe_count, 2
+        )
+
+    def test_import_invalid_lines(self):
+        """Test invalid lines are reported and the rest created."""
+        body = (
+            recipe_line('Curry') + '{not json\n' +
+            recipe_line('Salad', time_minutes='soon')
+        )
+
+        res = self._import(body)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['invalid'], 2)
+        self.assertEqual(
+            [error['line'] for error in res.data['errors']], [2, 3]
+        )
+        self.assertIn('time_minutes', res.data['errors'][1]['errors'])
+
+    def test_import_only_invalid(self):
+        """Test an import without any valid line is a bad request."""
+        res = self._import('[]\n')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_queries_per_batch(self):
+        """Test the number of queries depends on batches, not recipes."""
+        def lines(count):
+            return [
+                recipe_line(
+                    f'Recipe {i}',
+                    tags=[{'name': f'Tag {i}'}],
+                    ingredients=[{'name': f'Ingredient {i}'}],
+                )
+                for i in range(count)
+            ]
+
+        # Savepoint, two tag and ingredient lookups, two bulk inserts,
+        # then the recipes, two sets of through rows, search vectors and
+        # two locks and recipe recounts.
+        with self.assertNumQueries(16):
+            import_recipes(self.user, lines(5), batch_size=50)
+        with self.assertNumQueries(16):
+            import_recipes(self.user, lines(50), batch_size=50)
+
+    def test_import_invalidates_list_cache(self):
+        """Test imported recipes show in a previously cached list."""
+        self.client.get(RECIPES_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._import(recipe_line('Curry'))
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([r['title'] for r in res.data], ['Curry'])
+
+
+class BulkExportTests(TestCase):
+    """Test exporting recipes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_export_recipes(self):
+        """Test the user's recipes are streamed one per line."""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Curry',
+            time_minutes=10,
+            price=Decimal('5.50'),
+        )
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        Recipe.objects.create(
+            user=other, title='Other', time_minutes=1, price=Decimal('1.00')
+        )
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{
+            'id': recipe.id,
+            'title': 'Curry',
+            'time_minutes': 10,
+            'price': '5.50',
+            'link': '',
+            'description': '',
+            'tags': [{'id': tag.id, 'name': 'Vegan'}],
+            'ingredients': [],
+        }])
+
+    def _create_recipes(self, count):
+        tag = Tag.objects.create(user=self.user, name='Vegan, raw')
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=1,
+                price=Decimal('1.00'),
+            )
+            recipe.tags.add(tag)
+        return tag
+
+    def test_export_json(self):
+        """Test exporting recipes as one JSON array."""
+        self._create_recipes(3)
+
+        res = self.client.get(EXPORT_URL, {'format': 'json'})
+
+        self.assertEqual(res['Content-Type'], 'application/json')
+        data = json.loads(b''.join(res.streaming_content))
+        self.assertEqual(
+            [recipe['title'] for recipe in data],
+            ['Recipe 0', 'Recipe 1', 'Recipe 2'],
+        )
+
+    def test_export_json_empty(self):
+        """Test exporting no recipes as JSON gives an empty array."""
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT='application/json')
+
+        self.assertEqual(json.loads(b''.join(res.streaming_content)), [])
+
+    def test_export_csv(self):
+        """Test exporting recipes as CSV with tags listed by name."""
+        self._create_recipes(2)
+
+        res = self.client.get(EXPORT_URL, HTTP_ACCEPT='text/csv')
+
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('recipes.csv', res['Content-Disposition'])
+        rows = list(csv.DictReader(
+            b''.join(res.streaming_content).decode().splitlines()
+        ))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['title'], 'Recipe 0')
+        self.assertEqual(rows[0]['tags'], 'Vegan, raw')
+        self.assertEqual(rows[0]['ingredients'], '')
+
+    def test_export_filtered(self):
+        """Test the export is filtered like the list."""
+        tag = self._create_recipes(2)
+        Recipe.objects.create(
+            user=self.user, title='Untagged', time_minutes=1,
+            price=Decimal('1.00'),
+        )
+
+        res = self.client.get(EXPORT_URL, {'tags': tag.id})
+
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+
+    def test_export_queries_per_batch(self):
+        """Test each batch loads its relations with one query apiece."""
+        for i in range(5):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=1,
+                price=Decimal('1.00'),
+            )
+
+        # The cursor, then the tags and ingredients of each batch.
+        with self.assertNumQueries(1 + 3 * 2):
+            chunks = list(export_recipes(
+                Recipe.objects.filter(user=self.user), batch_size=2
+            ))
+
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(''.join(chunks).splitlines()), 5)
+
+    def test_export_without_server_side_cursors(self):
+        """Test recipes are paged by id where cursors are disabled."""
+        self._create_recipes(5)
+        expected = export_lines(self.user)
+
+        with patch.dict(
+            connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}
+        ):
+            # A page of recipes, then the tags and ingredients of each.
+            with self.assertNumQueries(3 * 3):
+                chunks = list(export_recipes(
+                    Recipe.objects.filter(user=self.user), batch_size=2
+                ))
+
+        self.assertEqual(
+            [json.loads(line) for line in ''.join(chunks).splitlines()],
+            expected,
+        )
+
+    def test_export_ordered(self):
+        """Test the export keeps the ordering asked for."""
+        for i, price in enumerate(('3.00', '1.00', '3.00', '2.00')):
+            Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=1,
+                price=Decimal(price),
+            )
+
+        res = self.client.get(EXPORT_URL, {'ordering': '-price'})
+
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)['title'] for line in lines],
+            ['Recipe 2', 'Recipe 0', 'Recipe 3', 'Recipe 1'],
+        )
+
+    def test_export_searched(self):
+        """Test a searched export has the best matches first."""
+        with self.captureOnCommitCallbacks(execute=True):
+            for title in (
+                'Garlic soup', 'Garlic garlic soup', 'Garlic stew',
+            ):
+                Recipe.objects.create(
+                    user=self.user, title=title, time_minutes=1,
+                    price=Decimal('1.00'),
+                )
+
+        res = self.client.get(EXPORT_URL, {'search': 'garlic soup'})
+
+        rows = [
+            json.loads(line) for line in
+            b''.join(res.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(
+            [row['title'] for row in rows],
+            ['Garlic garlic soup', 'Garlic soup'],
+        )
+        self.assertNotIn('rank', rows[0])
+
+    def test_export_ordered_without_server_side_cursors(self):
+        """Test pages of an ordered export seek past ties."""
+        for price in ('3.00', '1.00', '3.00', '3.00', '2.00'):
+            Recipe.objects.create(
+                user=self.user, title='Recipe', time_minutes=1,
+                price=Decimal(price),
+            )
+        recipes = Recipe.objects.filter(user=self.user).order_by(
+            '-price', '-id',
+        )
+        expected = list(recipes.values_list('id', flat=True))
+
+        with patch.dict(
+            connection.settings_dict, {'DISABLE_SERVER_SIDE_CURSORS': True}
+        ):
+            chunks = list(export_recipes(recipes, batch_size=2))
+
+        self.assertEqual(
+            [json.loads(line)['id'] for line in ''.join(chunks).splitlines()],
+            expected,
+        )
+
+
+class BulkCommandTests(TestCase):
+    """Test the import and export commands."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+
+    def test_round_trip(self):
+        """Test exported recipes import as the same recipes."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.jsonl')
+            with open(path, 'w') as lines:
+                lines.write(recipe_line('Curry', tags=[{'name': 'Vegan'}]))
+                lines.write(recipe_line('Salad'))
+
+            out = StringIO()
+            call_command(
+                'import_recipes', path, user='user@example.com', stdout=out
+            )
+            self.assertIn('Created 2 recipes', out.getvalue())
+
+            exported = export_lines(self.user)
+            other = get_user_model().objects.create_user(
+                'other@example.com',
+                'testpass123',
+            )
+            call_command(
+                'export_recipes', user='user@example.com', output=path,
+                stderr=StringIO(),
+            )
+            call_command(
+                'import_recipes', path, user='other@example.com',
+                stdout=StringIO(),
+            )
+
+        def without_ids(recipes):
+            for recipe in recipes:
+                del recipe['id']
+                for field in ('tags', 'ingredients'):
+                    recipe[field] = [item['name'] for item in recipe[field]]
+            return recipes
+
+        self.assertEqual(
+            without_ids(export_lines(other)), without_ids(exported)
+        )
@@ -0,0 +1,161 @@
+"""
+Tests for the recipe management commands.
+"""
+import os
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.uploads import get_storage
+
+
+def save_file(name, content, age=0):
+    """Save a file to the recipe image storage, aged by age seconds."""
+    storage = get_storage()
+    name = storage.save(name, ContentFile(content))
+    mtime = time.time() - age
+    os.utime(storage.path(name), (mtime, mtime))
+
+    return name
+
+
+class CollectOrphanImagesTests(TestCase):
+    """Test garbage collecting unreferenced recipe images."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass',
+        )
+        self.storage = get_storage()
+        self.names = []
+
+    def tearDown(self):
+        for name in self.names:
+            self.storage.delete(name)
+
+    def _save(self, content, age=0, name='uploads/recipe/image.jpg'):
+        name = save_file(name, content, age)
+        self.names.append(name)
+        return name
+
+    def _recipe(self, **params):
+        return Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price='5.00',
+            **params,
+        )
+
+    def test_orphans_deleted(self):
+        """Test old unreferenced images are deleted and others kept."""
+        shared = self._save(b'shared', age=7200)
+        variant = self._save(
+            b'variant', age=7200, name='uploads/recipe/variants/v.jpg'
+        )
+        orphan = self._save(b'orphan', age=7200)
+        recent = self._save(b'recent')
+        for _ in range(2):
+            self._recipe(
+                image=shared,
+                image_variants={'thumbnail': {'width': 1, 'jpeg': variant}},
+            )
+
+        out = StringIO()
+        call_command('collect_orphan_images', stdout=out)
+
+        self.assertTrue(self.storage.exists(shared))
+        self.assertTrue(self.storage.exists(variant))
+        self.assertTrue(self.storage.exists(recent))
+        self.assertFalse(self.storage.exists(orphan))
+        self.assertIn('Deleted 1 files', out.getvalue())
+
+    def test_dry_run(self):
+        """Test a dry run lists orphans without deleting them."""
+        orphan = self._save(b'orphan', age=7200)
+
+        out = StringIO()
+        call_command('collect_orphan_images', dry_run=True, stdout=out)
+
+        self.assertIn(orphan, out.getvalue())
+        self.assertTrue(self.storage.exists(orphan))
+
+
+class RepairRecipeCountsTests(TestCase):
+    """Test repairing the recipe counts of tags and ingredients."""
+
+    def test_drifted_counts_repaired(self):
+        """Test wrong counts are fixed and right ones kept."""
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass',
+        )
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price='5.00',
+        )
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=user, name='Leek')
+        recipe.tags.add(tag)
+        recipe.ingredients.add(ingredient)
+        Tag.objects.update(recipe_count=5)
+
+        out = StringIO()
+        call_command('repair_recipe_counts', batch_size=1, stdout=out)
+
+        tag.refresh_from_db()
+        ingredient.refresh_from_db()
+        self.assertEqual((tag.recipe_count, ingredient.recipe_count), (1, 1))
+        self.assertIn('Repaired 1 of 1 tags', out.getvalue())
+        self.assertIn('Repaired 0 of 1 ingredients', out.getvalue())
+
+
+class ProcessStuckImagesTests(TestCase):
+    """Test processing images whose processing was lost."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass',
+        )
+
+    def _recipe(self, status, age):
+        """Create a recipe with an image in status, last changed age ago."""
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price='5.00',
+            image='uploads/recipe/image.jpg',
+            image_status=status,
+        )
+        Recipe.objects.filter(pk=recipe.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=age),
+        )
+        return recipe
+
+    @patch('recipe.management.commands.process_stuck_images.'
+           'process_recipe_image')
+    def test_stuck_images_processed(self, process):
+        """Test old pending and processing images are processed."""
+        pending = self._recipe(Recipe.IMAGE_PENDING, 3600)
+        processing = self._recipe(Recipe.IMAGE_PROCESSING, 3600)
+        self._recipe(Recipe.IMAGE_PENDING, 60)
+        self._recipe(Recipe.IMAGE_READY, 3600)
+
+        out = StringIO()
+        call_command('process_stuck_images', timeout=600, stdout=out)
+
+        self.assertEqual(
+            sorted(call.args[0] for call in process.call_args_list),
+            [pending.pk, processing.pk],
+        )
+        self.assertIn('Processed 2 stuck images', out.getvalue())
@@ -109,6 +109,7 @@ class PrivateIngredientAPITest(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
+        in1.refresh_from_db()
         s1 = IngredientSerializer(in1)
         s2 = IngredientSerializer(in2)
 
@@ -0,0 +1,217 @@
+"""
+Test caching of the recipe API list responses.
+"""
+import threading
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import override_settings, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(RECIPE_LIST_CACHE_ALIAS='default')
+class ListCacheTests(TestCase):
+    """Test cached list responses."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """Test a repeated list does not query the database."""
+        create_recipe(user=self.user)
+        res1 = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            res2 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res2.status_code, status.HTTP_200_OK)
+        self.assertEqual(res1.data, res2.data)
+
+    def test_cache_per_query_string(self):
+        """Test different query strings are cached separately."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL, {'tags': tag.id})
+
+        self.assertEqual(res.data, [])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.add(tag)
+        res = self.client.get(RECIPES_URL, {'tags': tag.id})
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+    def test_cache_per_user(self):
+        """Test users do not see each other's cached lists."""
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(other)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data, [])
+
+    def test_recipe_change_invalidates(self):
+        """Test saving a recipe invalidates the list."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        recipe.title = 'New title'
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.save()
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['title'], 'New title')
+
+    def test_tag_change_invalidates(self):
+        """Test renaming a tag invalidates recipe and tag lists."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        self.client.get(RECIPES_URL)
+        self.client.get(TAGS_URL)
+
+        tag.name = 'Vegetarian'
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.save()
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Vegetarian')
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data[0]['name'], 'Vegetarian')
+
+    def test_relation_change_invalidates(self):
+        """Test adding a tag to a recipe invalidates the list."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Vegan')
+
+    def test_if_none_match_not_modified(self):
+        """Test an unchanged list with a matching ETag returns 304."""
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(
+                RECIPES_URL, HTTP_IF_NONE_MATCH=res['ETag']
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_if_none_match_after_change(self):
+        """Test a changed list does not match the previous ETag."""
+        res = self.client.get(RECIPES_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_if_modified_since_not_modified(self):
+        """Test an unchanged list since Last-Modified returns 304."""
+        res = self.client.get(TAGS_URL)
+
+        res = self.client.get(
+            TAGS_URL, HTTP_IF_MODIFIED_SINCE=res['Last-Modified']
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+@override_settings(RECIPE_LIST_CACHE_ALIAS=None)
+class ListNotCachedTests(TestCase):
+    """Test lists without a cache shared by the workers."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_cached(self):
+        """Test a change made elsewhere is listed without invalidation."""
+        recipe = create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        Recipe.objects.filter(pk=recipe.pk).update(title='Changed')
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['title'], 'Changed')
+        self.assertNotIn('ETag', res)
+
+
+@override_settings(RECIPE_LIST_CACHE_ALIAS='default')
+class ListCacheCommitTests(TransactionTestCase):
+    """Test cached lists are invalidated when changes commit."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _get_concurrently(self, url):
+        """Make a request on a connection of its own, as another worker."""
+        def get():
+            self.client.get(url)
+            connection.close()
+
+        thread = threading.Thread(target=get)
+        thread.start()
+        thread.join()
+
+    def test_read_before_commit_not_cached(self):
+        """Test a list read while a change commits isn't served after it."""
+        recipe = create_recipe(user=self.user)
+
+        with transaction.atomic():
+            recipe.title = 'New title'
+            recipe.save()
+            self._get_concurrently(RECIPES_URL)
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['title'], 'New title')
@@ -0,0 +1,127 @@
+"""
+Test the fast path of the recipe list renders as RecipeSerializer does.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.serializers import RecipeSerializer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeListContractTests(TestCase):
+    """Test the recipe list is byte for byte RecipeSerializer's output."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+        dinner = Tag.objects.create(user=self.user, name='Dinner "late"')
+        rice = Ingredient.objects.create(user=self.user, name='Rice')
+        curry = create_recipe(
+            self.user,
+            title='Curry — très épicé',
+            price=Decimal('0.50'),
+            link='https://example.com/curry',
+            description='Not listed.',
+            image_variants={
+                'small': {'width': 320, 'height': 200, 'jpeg': 'a.jpg'},
+                'large': {
+                    'width': 1600, 'height': 1000,
+                    'jpeg': 'b.jpg', 'webp': 'b.webp',
+                },
+            },
+        )
+        # Added in the opposite order to their ids.
+        curry.tags.add(dinner)
+        curry.tags.add(vegan)
+        curry.ingredients.add(rice)
+        create_recipe(self.user, title='Toast', time_minutes=2)
+        create_recipe(self.user, title='Rice salad').ingredients.add(rice)
+
+    def _expected(self, params, recipes):
+        """Return the recipes rendered by RecipeSerializer."""
+        request = Request(APIRequestFactory().get(RECIPES_URL, params))
+        recipes = recipes.prefetch_related(*(
+            Prefetch(field, queryset=model.objects.order_by('id'))
+            for field, model in (('tags', Tag), ('ingredients', Ingredient))
+        ))
+        data = RecipeSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+
+        return JSONRenderer().render(data)
+
+    def assertSameAsSerializer(self, params=None, ordering=('-id',)):
+        """Assert the list for params renders like the serializer."""
+        params = params or {}
+        res = self.client.get(RECIPES_URL, params)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by(*ordering)
+        self.assertEqual(res.content, self._expected(params, recipes))
+
+    def test_all_fields(self):
+        """Test the default list."""
+        self.assertSameAsSerializer()
+
+    def test_sparse_fields(self):
+        """Test narrowed lists."""
+        self.assertSameAsSerializer({'fields': 'price,title,tags'})
+        self.assertSameAsSerializer({'exclude': 'ingredients,id'})
+
+    def test_no_fields(self):
+        """Test lists narrowed to no fields."""
+        self.assertSameAsSerializer({'fields': ''})
+        self.assertSameAsSerializer({'fields': ','})
+        self.assertSameAsSerializer(
+            {'exclude': ','.join(RecipeSerializer.Meta.fields)}
+        )
+
+    def test_ordering(self):
+        """Test a list ordered by another field."""
+        self.assertSameAsSerializer(
+            {'ordering': 'time_minutes'}, ordering=('time_minutes', 'id'),
+        )
+
+    def test_page(self):
+        """Test a page of the list."""
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')[:2]
+        self.assertEqual(
+            JSONRenderer().render(res.data['results']),
+            self._expected({'page_size': 2}, recipes),
+        )
+
+    def test_empty(self):
+        """Test a list without recipes."""
+        Recipe.objects.all().delete()
+
+        self.assertSameAsSerializer()
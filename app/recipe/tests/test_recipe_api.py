@@ -1,20 +1,41 @@
 """Test recipe APIs."""
+import hashlib
+import io
+import json
 import tempfile
+import threading
 import os
-from PIL import Image
+import warnings
+from unittest.mock import patch
+from urllib.parse import urlencode
+from PIL import features, Image
 
 
+from datetime import timedelta
 from decimal import Decimal
 
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
 from django.contrib.auth import get_user_model
 from core.models import Recipe, Tag, Ingredient
 from rest_framework import status
+from rest_framework.pagination import Cursor
 from rest_framework.test import APIClient
 
+from recipe.images import (
+    _process_in_worker,
+    get_formats,
+    process_recipe_image,
+    variant_names,
+)
+from recipe.pagination import KeysetPagination
+from recipe.uploads import ResumableUpload
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import recipe_etag
 
 RECIPES_URL = reverse('recipe:recipe-list')
 
@@ -24,6 +45,13 @@ def detail_url(recipe_id):
     """Return recipe detail URL"""
     return reverse('recipe:recipe-detail', args=[recipe_id])
 
+def cursor_url(url, values, params=None):
+    """Return url, with params, and a cursor positioned at values."""
+    paginator = KeysetPagination()
+    paginator.base_url = f'{url}?{urlencode(params or {})}'
+    return paginator.encode_cursor(Cursor(0, False, json.dumps(values)))
+
+
 def create_user(**params):
     """Create new user"""
     return get_user_model().objects.create_user(**params)
@@ -47,8 +75,56 @@ def create_recipe(user, **params):
     recipe = Recipe.objects.create(user=user, **defaults)
     return recipe
 
+def create_recipe_with_relations(user, **params):
+    """Create a new recipe with a couple of tags and ingredients"""
+    recipe = create_recipe(user, **params)
+    for i in range(2):
+        name = f'{recipe.id}-{i}'
+        recipe.tags.add(Tag.objects.create(user=user, name=f'Tag {name}'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=user, name=f'Ingredient {name}')
+        )
+
+    return recipe
+
+def count_queries(func):
+    """Return the number of queries run by func"""
+    with CaptureQueriesContext(connection) as ctx:
+        func()
+
+    return len(ctx.captured_queries)
+
+def count_through_writes(ctx, table):
+    """Return the number of inserts and deletes captured on table"""
+    return sum(
+        1 for query in ctx.captured_queries
+        if query['sql'].startswith((
+            f'INSERT INTO "{table}"', f'DELETE FROM "{table}"'
+        ))
+    )
+
 # End helper functions
 
+
+class QueryBudgetMixin:
+    """Assertions on the number of queries an endpoint runs."""
+
+    def assertQueryBudget(self, budget, request, grow, sizes=(1, 10, 25)):
+        """
+        Assert request stays within budget queries while grow adds data.
+
+        grow(n) is called before each request to bring the data set up to
+        n items, so a query per item shows up as a failure at the larger
+        sizes.
+        """
+        for size in sizes:
+            grow(size)
+            num = count_queries(request)
+            self.assertLessEqual(
+                num, budget,
+                f'{num} queries with {size} items, budget is {budget}.'
+            )
+
 class PublicRecipeApiTests(TestCase):
     """Test unauthenticated APIs requests."""
 
@@ -399,6 +475,50 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_partial_update_keeps_relations(self):
+        """Test updating only the title leaves tags and ingredients."""
+        recipe = create_recipe_with_relations(user=self.user)
+
+        payload = {'title': 'Update recipe title'}
+        res = self.client.patch(detail_url(recipe.id), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(recipe.ingredients.count(), 2)
+
+    def test_update_unchanged_tags_writes_nothing(self):
+        """Test sending the current tags does not rewrite through rows."""
+        recipe = create_recipe_with_relations(user=self.user)
+        payload = {
+            'tags': [{'name': tag.name} for tag in recipe.tags.all()],
+        }
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(count_through_writes(ctx, 'core_recipe_tags'), 0)
+        self.assertEqual(recipe.tags.count(), 2)
+
+    def test_update_add_tag_writes_one_row(self):
+        """Test adding one tag inserts only that through row."""
+        recipe = create_recipe_with_relations(user=self.user)
+        payload = {
+            'tags': [{'name': tag.name} for tag in recipe.tags.all()] +
+            [{'name': 'Brunch'}],
+        }
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(
+                detail_url(recipe.id), payload, format='json'
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(count_through_writes(ctx, 'core_recipe_tags'), 1)
+        self.assertEqual(recipe.tags.count(), 3)
+
     def test_filter_by_tags(self):
         """Test filtering recipe by tags."""
 
@@ -420,6 +540,39 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
     
+    def test_filter_by_tags_match_all(self):
+        """Test filtering recipes that have all the given tags."""
+        r1 = create_recipe(user=self.user, title='Vegan Curry')
+        r2 = create_recipe(user=self.user, title='Vegan Salad')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [r1.id])
+
+    def test_filter_by_tags_no_duplicates(self):
+        """Test a recipe matching several tags is listed once."""
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+    def test_filter_invalid_match(self):
+        """Test an unknown match value is rejected."""
+        res = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients."""
         
@@ -441,6 +594,588 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_by_time_and_price(self):
+        """Test filtering recipes by ranges of time and price."""
+        quick = create_recipe(
+            user=self.user, time_minutes=10, price=Decimal('4.00')
+        )
+        create_recipe(user=self.user, time_minutes=90, price=Decimal('4.00'))
+        create_recipe(user=self.user, time_minutes=10, price=Decimal('12.50'))
+
+        params = {'max_time': 30, 'min_price': '1', 'max_price': '9.99'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [quick.id])
+
+    def test_filter_invalid_range(self):
+        """Test a bound that is not a number is rejected."""
+        for params in ({'min_time': 'soon'}, {'max_price': 'cheap'}):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(list(params)[0], res.data)
+
+    def test_filter_range_out_of_bounds(self):
+        """Test bounds the columns can't hold are rejected."""
+        for params in (
+            {'min_price': 'nan'},
+            {'max_price': 'Infinity'},
+            {'max_price': '1e999999'},
+            {'min_price': '1000'},
+            {'min_price': '1.005'},
+            {'max_time': '1e3'},
+            {'max_time': str(2 ** 31)},
+        ):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(list(params)[0], res.data)
+
+    def test_ordering(self):
+        """Test ordering recipes by a field, then by id."""
+        r1 = create_recipe(user=self.user, price=Decimal('7.00'))
+        r2 = create_recipe(user=self.user, price=Decimal('3.00'))
+        r3 = create_recipe(user=self.user, price=Decimal('7.00'))
+
+        res = self.client.get(RECIPES_URL, {'ordering': 'price'})
+        self.assertEqual([r['id'] for r in res.data], [r2.id, r1.id, r3.id])
+
+        res = self.client.get(RECIPES_URL, {'ordering': '-price'})
+        self.assertEqual([r['id'] for r in res.data], [r3.id, r1.id, r2.id])
+
+    def test_ordering_invalid(self):
+        """Test ordering by a field that isn't allowed is rejected."""
+        for ordering in ('title', '--price', 'user__email'):
+            res = self.client.get(RECIPES_URL, {'ordering': ordering})
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ordering_paginated(self):
+        """Test paging through an ordering with ties visits every recipe."""
+        recipes = [
+            create_recipe(user=self.user, time_minutes=minutes)
+            for minutes in (20, 5, 20, 20, 5, 60)
+        ]
+
+        ids = []
+        params = {'ordering': 'time_minutes', 'page_size': 2}
+        url = RECIPES_URL
+        while url:
+            res = self.client.get(url, params)
+            ids += [r['id'] for r in res.data['results']]
+            url, params = res.data['next'], None
+
+        expected = sorted(recipes, key=lambda r: (r.time_minutes, r.id))
+        self.assertEqual(ids, [recipe.id for recipe in expected])
+
+    def test_ordering_paginated_past_offset_cutoff(self):
+        """Test paging through more ties than a cursor offset allows."""
+        recipes = [
+            create_recipe(user=self.user, price=Decimal('4.00'))
+            for _ in range(7)
+        ]
+
+        pages = []
+        params = {'ordering': '-price', 'page_size': 2}
+        url = RECIPES_URL
+        with patch.object(KeysetPagination, 'offset_cutoff', 2):
+            while url:
+                res = self.client.get(url, params)
+                pages.append([r['id'] for r in res.data['results']])
+                url, params = res.data['next'], None
+            res = self.client.get(res.data['previous'])
+
+        self.assertEqual(
+            sum(pages, []), [recipe.id for recipe in reversed(recipes)],
+        )
+        self.assertEqual([r['id'] for r in res.data['results']], pages[-2])
+
+    def test_list_paginated_with_page_size(self):
+        """Test requesting a page size returns a keyset page."""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [recipes[2].id, recipes[1].id],
+        )
+        self.assertIsNotNone(res.data['next'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_list_paginated_follow_cursor(self):
+        """Test following the next cursor seeks past the previous page."""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        res = self.client.get(res.data['next'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [recipes[0].id],
+        )
+        self.assertIsNone(res.data['next'])
+        self.assertIsNotNone(res.data['previous'])
+
+    def test_list_paginated_page_size_capped(self):
+        """Test the requested page size is capped."""
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        with patch.object(KeysetPagination, 'max_page_size', 2):
+            res = self.client.get(RECIPES_URL, {'page_size': 1000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_list_invalid_cursor(self):
+        """Test an invalid cursor returns not found."""
+        res = self.client.get(RECIPES_URL, {'cursor': 'notacursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_invalid_cursor_values(self):
+        """Test a cursor with values of the wrong types returns not found."""
+        create_recipe(user=self.user)
+        for values, params in (
+            (['abc'], {}),
+            (['x', '1'], {'ordering': 'price'}),
+            (['x', '1'], {'search': 'sample'}),
+        ):
+            with self.subTest(values=values, params=params):
+                res = self.client.get(cursor_url(RECIPES_URL, values, params))
+
+                self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_cursor_values(self):
+        """Test a cursor with valid values seeks past them."""
+        recipes = [create_recipe(user=self.user) for _ in range(3)]
+
+        res = self.client.get(cursor_url(RECIPES_URL, [str(recipes[1].id)]))
+
+        self.assertEqual(
+            [r['id'] for r in res.data['results']], [recipes[0].id],
+        )
+
+class RecipeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test recipe APIs run a constant number of queries."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe_with_relations(user=self.user)
+
+    def _grow(self, size):
+        """Grow the user's recipes to size."""
+        while Recipe.objects.filter(user=self.user).count() < size:
+            create_recipe_with_relations(user=self.user)
+
+    def _grow_relations(self, size):
+        """Grow the number of tags and ingredients on the recipe to size."""
+        while self.recipe.tags.count() < size:
+            n = self.recipe.tags.count()
+            self.recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Extra {n}')
+            )
+            self.recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Extra {n}')
+            )
+
+    def test_list_query_budget(self):
+        """Test listing recipes does not query per recipe."""
+        self.assertQueryBudget(
+            3, lambda: self.client.get(RECIPES_URL), self._grow,
+        )
+
+    def test_list_paginated_query_budget(self):
+        """Test listing a page of recipes does not query per recipe."""
+        self.assertQueryBudget(
+            3,
+            lambda: self.client.get(RECIPES_URL, {'page_size': 50}),
+            self._grow,
+        )
+
+    def test_retrieve_query_budget(self):
+        """Test retrieving a recipe does not query per relation."""
+        self.assertQueryBudget(
+            3,
+            lambda: self.client.get(detail_url(self.recipe.id)),
+            self._grow_relations,
+        )
+
+    def test_update_query_budget(self):
+        """Test updating a recipe does not query per relation."""
+        def update():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(
+                    detail_url(self.recipe.id), {'title': 'New title'}
+                )
+
+        # Includes recomputing the search vector of the new title once
+        # committed, and reading back the new version.
+        self.assertQueryBudget(10, update, self._grow_relations)
+
+
+    def _create_with_items(self, count):
+        """Create a recipe with count new and count existing items."""
+        for i in range(count):
+            Tag.objects.create(user=self.user, name=f'Existing tag {i}')
+            Ingredient.objects.create(user=self.user, name=f'Existing {i}')
+        payload = {
+            'title': 'Big recipe',
+            'time_minutes': 30,
+            'price': Decimal('9.99'),
+            'tags': [
+                {'name': f'{prefix} tag {i}'}
+                for i in range(count) for prefix in ('Existing', 'New')
+            ],
+            'ingredients': [
+                {'name': f'{prefix} {i}'}
+                for i in range(count) for prefix in ('Existing', 'New')
+            ],
+        }
+
+        return count_queries(
+            lambda: self.client.post(RECIPES_URL, payload, format='json')
+        )
+
+    def test_create_queries_independent_of_item_count(self):
+        """Test creating a recipe costs the same with 1 or 40 items."""
+        small = self._create_with_items(1)
+        Recipe.objects.filter(user=self.user).delete()
+        Tag.objects.filter(user=self.user).delete()
+        Ingredient.objects.filter(user=self.user).delete()
+        large = self._create_with_items(40)
+
+        self.assertEqual(small, large)
+        recipe = Recipe.objects.get(user=self.user, title='Big recipe')
+        self.assertEqual(recipe.tags.count(), 80)
+        self.assertEqual(recipe.ingredients.count(), 80)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 80)
+
+    def test_create_duplicate_names_once(self):
+        """Test repeated names in a payload create a single object."""
+        payload = {
+            'title': 'Soup',
+            'time_minutes': 30,
+            'price': Decimal('3.00'),
+            'tags': [{'name': 'Soup'}, {'name': 'Soup'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Soup').count(), 1
+        )
+
+class RecipeConditionalRequestTests(TestCase):
+    """Test conditional requests on the recipe detail."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe_with_relations(user=self.user)
+        self.url = detail_url(self.recipe.id)
+
+    def test_retrieve_etag(self):
+        """Test the detail carries the recipe version as its ETag."""
+        res = self.client.get(self.url)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res['ETag'], recipe_etag(
+            self.recipe.id, self.recipe.version, 'application/json',
+        ))
+        self.assertIn('Last-Modified', res)
+
+    def test_etag_per_media_type(self):
+        """Test JSON and MessagePack responses have ETags of their own."""
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(
+            self.url,
+            HTTP_ACCEPT='application/msgpack',
+            HTTP_IF_NONE_MATCH=etag,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertIn('Accept', res['Vary'])
+
+    def test_retrieve_if_none_match(self):
+        """Test an unchanged recipe returns 304 with a single query."""
+        etag = self.client.get(self.url)['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_retrieve_if_modified_since(self):
+        """Test a recipe unchanged since Last-Modified returns 304."""
+        last_modified = self.client.get(self.url)['Last-Modified']
+
+        res = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_on_relation_change(self):
+        """Test adding a tag changes the ETag."""
+        etag = self.client.get(self.url)['ETag']
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='New'))
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_etag_changes_on_tag_rename(self):
+        """Test renaming one of the recipe's tags changes the ETag."""
+        etag = self.client.get(self.url)['ETag']
+
+        tag = self.recipe.tags.first()
+        tag.name = 'Renamed'
+        tag.save()
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_update_if_match(self):
+        """Test updating with the current ETag succeeds."""
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.patch(
+            self.url, {'title': 'New title'}, HTTP_IF_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=res['ETag'])
+            .status_code,
+            status.HTTP_304_NOT_MODIFIED,
+        )
+
+    def test_update_stale_if_match(self):
+        """Test updating with an outdated ETag is rejected."""
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'title': 'Other change'})
+
+        res = self.client.patch(
+            self.url, {'title': 'Lost update'}, HTTP_IF_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'Other change')
+
+    def test_update_with_tags_bumps_version_once_per_change(self):
+        """Test the response ETag matches the stored version."""
+        res = self.client.patch(
+            self.url, {'tags': [{'name': 'Lunch'}]}, format='json'
+        )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res['ETag'], recipe_etag(
+            self.recipe.id, self.recipe.version, 'application/json',
+        ))
+
+class SparseFieldsTests(TestCase):
+    """Test narrowing responses with the fields and exclude parameters."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe_with_relations(
+            user=self.user, description='Not in the list.'
+        )
+
+    def _get(self, url, params=None, **extra):
+        """Return the response and the SQL of its queries."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params, **extra)
+
+        return res, [query['sql'] for query in ctx.captured_queries]
+
+    def test_list_fields(self):
+        """Test only the fields asked for are selected and returned."""
+        res, queries = self._get(RECIPES_URL, {'fields': 'title,id'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data[0]), ['id', 'title'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"link"', queries[0])
+
+    def test_list_exclude(self):
+        """Test excluded relations are not loaded."""
+        res, queries = self._get(
+            RECIPES_URL, {'exclude': 'tags,ingredients,image_srcset'}
+        )
+
+        self.assertEqual(
+            set(res.data[0]), {'id', 'title', 'time_minutes', 'price', 'link'}
+        )
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"image_variants"', queries[0])
+
+    def test_list_skips_unrendered_columns(self):
+        """Test the list doesn't select columns it never renders."""
+        res, queries = self._get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('tags', res.data[0])
+        for column in ('description', 'image', 'search_vector'):
+            self.assertNotIn(f'"{column}"', queries[0])
+
+    def test_paginated_fields(self):
+        """Test a page ordered by a field not returned is one query."""
+        create_recipe(user=self.user, price=Decimal('1.00'))
+
+        res, queries = self._get(RECIPES_URL, {
+            'fields': 'title', 'ordering': 'price', 'page_size': 1,
+        })
+
+        self.assertIsNotNone(res.data['next'])
+        self.assertEqual(len(queries), 1)
+
+    def test_detail_fields_etag(self):
+        """Test narrowed details have ETags of their own."""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.get(url, {'fields': 'description'})
+        self.assertEqual(res.data, {'description': 'Not in the list.'})
+        self.assertNotEqual(res['ETag'], etag)
+
+        res = self.client.get(
+            url, {'fields': 'description'}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.get(
+            url, {'fields': 'description'}, HTTP_IF_NONE_MATCH=res['ETag']
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_invalid_fields(self):
+        """Test unknown fields, or both parameters, are rejected."""
+        for params in (
+            {'fields': 'title,user'},
+            {'exclude': 'search_vector'},
+            {'fields': 'title', 'exclude': 'price'},
+        ):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tag_fields(self):
+        """Test narrowing the tags list."""
+        res = self.client.get(reverse('recipe:tag-list'), {'fields': 'name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([set(tag) for tag in res.data], [{'name'}] * 2)
+
+
+class RecipeFilterPlanTests(TestCase):
+    """Test the query plan of filtered recipe lists."""
+
+    def setUp(self):
+        self.user = create_user(email='user@example.com', password='test123')
+        tags = Tag.objects.bulk_create([
+            Tag(user=self.user, name=f'Tag {i}') for i in range(20)
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(
+                user=self.user,
+                title=f'Recipe {i}',
+                description='A long description. ' * 20,
+                time_minutes=5 + i % 120,
+                price=Decimal(1 + i % 50),
+            )
+            for i in range(5000)
+        ])
+        Through = Recipe.tags.through
+        Through.objects.bulk_create([
+            Through(recipe=recipe, tag=tags[(i + j) % len(tags)])
+            for i, recipe in enumerate(recipes) for j in range(3)
+        ])
+        self.tags = tags
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_recipe, core_recipe_tags')
+
+    def _plan(self, params):
+        """Return the EXPLAIN output of the recipe list query for params."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(RECIPES_URL, params)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + ctx.captured_queries[0]['sql'])
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def test_filter_plan_has_no_distinct(self):
+        """Test filtering by tags does not deduplicate whole rows."""
+        ids = f'{self.tags[0].id},{self.tags[1].id}'
+        for match in ('any', 'all'):
+            plan = self._plan({'tags': ids, 'match': match})
+
+            self.assertNotIn('Unique', plan)
+            self.assertNotIn('HashAggregate', plan)
+
+    def test_range_ordering_plan(self):
+        """Test a filtered, ordered page is read in order from an index."""
+        plan = self._plan({
+            'max_time': 30,
+            'max_price': 10,
+            'ordering': 'price',
+            'page_size': 20,
+        })
+
+        self.assertIn('recipe_user_price_idx', plan)
+        self.assertNotIn('Sort', plan)
+
+class ImageFormatsTests(TestCase):
+    """Test the formats image variants are written in."""
+
+    def test_formats_without_avif(self):
+        """Test a Pillow without AVIF support is checked quietly."""
+        with patch.dict(features.modules):
+            features.modules.pop('avif', None)
+            with warnings.catch_warnings():
+                warnings.simplefilter('error')
+                formats = get_formats()
+
+        self.assertEqual(formats[0], ('jpeg', 'JPEG', '.jpg'))
+        self.assertNotIn('avif', [key for key, _, _ in formats])
+
+
+class ImageWorkerTests(TestCase):
+    """Test processing images on the worker pool."""
+
+    @patch('recipe.images.process_recipe_image')
+    def test_worker_connection_closed(self, patched_process):
+        """Test a pool thread doesn't keep its connection once done."""
+        patched_process.side_effect = lambda pk: Recipe.objects.exists()
+        closed = []
+
+        def work():
+            _process_in_worker(1)
+            closed.append(connection.connection is None)
+
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+
+        patched_process.assert_called_once_with(1)
+        self.assertEqual(closed, [True])
+
+
 class ImageUploadTests(TestCase):
     """Test uploading images APIs."""
 
@@ -457,9 +1192,38 @@ class ImageUploadTests(TestCase):
     def tearDown(self):
         """Clean up after each test."""
         
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        for name in variant_names(self.recipe.image_variants):
+            storage.delete(name)
         self.recipe.image.delete()
 
-    
+    def _upload(self, size=(10, 10)):
+        """Upload a JPEG of size to the recipe."""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img = Image.new('RGB', size)
+            img.save(image_file, format='JPEG')
+            image_file.seek(0)
+            return self.client.post(
+                url, {'image': image_file}, format='multipart'
+            )
+
+    def test_upload_image_last_modified(self):
+        """Test uploading an image changes the recipe's Last-Modified."""
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            updated_at=timezone.now() - timedelta(hours=1),
+        )
+        before = self.client.get(detail_url(self.recipe.id))['Last-Modified']
+
+        self._upload()
+
+        res = self.client.get(
+            detail_url(self.recipe.id), HTTP_IF_MODIFIED_SINCE=before,
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['Last-Modified'], before)
+
     def test_upload_image(self):
         """Test upload image to recipe."""
 
@@ -485,4 +1249,238 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         # expected
-        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_pending(self):
+        """Test the image is processed after the upload responds."""
+        res = self._upload()
+
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    def test_upload_image_processed(self):
+        """Test processing writes the variants and marks the image ready."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload(size=(800, 400))
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        thumbnail = self.recipe.image_variants['thumbnail']
+        storage = self.recipe.image.storage
+        with Image.open(storage.path(thumbnail['jpeg'])) as img:
+            self.assertEqual(img.size, (200, 100))
+        self.assertEqual(
+            (thumbnail['width'], thumbnail['height']), (200, 100)
+        )
+        self.assertEqual(self.recipe.image_variants['medium']['width'], 800)
+        # Larger than the original, so the same as medium.
+        self.assertNotIn('large', self.recipe.image_variants)
+        for name in variant_names(self.recipe.image_variants):
+            self.assertTrue(storage.exists(name))
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    def test_detail_image_srcset(self):
+        """Test the detail lists the variants as a srcset per format."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload(size=(800, 400))
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        variants = res.data['image_variants']
+        self.assertEqual(
+            res.data['image_srcset']['jpeg'],
+            f'{variants["thumbnail"]["jpeg"]} 200w, '
+            f'{variants["medium"]["jpeg"]} 800w',
+        )
+        self.assertTrue(
+            variants['thumbnail']['jpeg'].startswith('http://testserver/')
+        )
+
+    def _stored_images(self):
+        """Return the names of the files in the recipe upload directory."""
+        storage = self.recipe.image.storage
+        if not storage.exists('uploads/recipe'):
+            return set()
+
+        return set(storage.listdir('uploads/recipe')[1])
+
+    def _image_bytes(self, size=(10, 10), image_format='PNG'):
+        """Return the contents of an image file."""
+        data = io.BytesIO()
+        Image.new('RGB', size).save(data, format=image_format)
+        return data.getvalue()
+
+    def _put_range(self, data, start, total):
+        """Upload the bytes of an image starting at start."""
+        end = start + len(data) - 1
+        return self.client.put(
+            image_upload_url(self.recipe.id),
+            data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{total}',
+        )
+
+    def test_upload_not_image_removed(self):
+        """Test a file that is not an image is rejected and removed."""
+        before = self._stored_images()
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(b'not an image' * 100)
+            image_file.seek(0)
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': image_file},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._stored_images(), before)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=50)
+    def test_upload_too_many_pixels(self):
+        """Test images decoding to too many pixels are rejected."""
+        before = self._stored_images()
+        res = self._upload(size=(10, 10))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', res.data['image'][0])
+        self.assertEqual(self._stored_images(), before)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_upload_too_large(self):
+        """Test files over the size limit are rejected."""
+        res = self._upload(size=(100, 100))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('larger', res.data['image'][0])
+
+    def test_upload_same_image_shared(self):
+        """Test the same image uploaded to two recipes is stored once."""
+        other = create_recipe(user=self.user)
+        data = self._image_bytes()
+        for recipe in (self.recipe, other):
+            with tempfile.NamedTemporaryFile(suffix='.PNG') as image_file:
+                image_file.write(data)
+                image_file.seek(0)
+                self.client.post(
+                    image_upload_url(recipe.id),
+                    {'image': image_file},
+                    format='multipart',
+                )
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, other.image.name)
+        self.assertEqual(
+            os.path.basename(self.recipe.image.name),
+            hashlib.sha256(data).hexdigest() + '.png',
+        )
+
+    def test_resumable_upload(self):
+        """Test uploading an image in byte ranges."""
+        data = self._image_bytes(size=(300, 300))
+        middle = len(data) // 2
+
+        res = self._put_range(data[:middle], 0, len(data))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res['Range'], f'bytes=0-{middle - 1}')
+
+        res = self._put_range(data[middle:], middle, len(data))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.png'))
+        with self.recipe.image.open('rb') as image_file:
+            self.assertEqual(image_file.read(), data)
+
+    def test_resumable_upload_restarted(self):
+        """Test an upload restarted from byte 0 replaces the bytes sent."""
+        data = self._image_bytes(size=(300, 300))
+        middle = len(data) // 2
+        self._put_range(data[:middle], 0, len(data))
+
+        res = self._put_range(data[:middle], 0, len(data))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res['Range'], f'bytes=0-{middle - 1}')
+
+        res = self._put_range(data[middle:], middle, len(data))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        with self.recipe.image.open('rb') as image_file:
+            self.assertEqual(image_file.read(), data)
+
+    def test_resumable_upload_offset(self):
+        """Test a range not following on is refused with the offset."""
+        data = self._image_bytes(size=(300, 300))
+        self._put_range(data[:100], 0, len(data))
+
+        res = self._put_range(data[200:], 200, len(data))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res['Range'], 'bytes=0-99')
+
+        res = self.client.put(
+            image_upload_url(self.recipe.id),
+            HTTP_CONTENT_RANGE=f'bytes */{len(data)}',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res['Range'], 'bytes=0-99')
+        ResumableUpload(self.recipe).discard()
+
+    def test_resumable_upload_not_image(self):
+        """Test a resumable upload that is not an image is discarded."""
+        data = b'not an image' * 100
+
+        res = self._put_range(data, 0, len(data))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(ResumableUpload(self.recipe).offset, 0)
+
+    @override_settings(RECIPE_IMAGE_WORKERS=2)
+    @patch('recipe.images.get_executor')
+    def test_upload_image_queued(self, patched_get_executor):
+        """Test processing is handed to the worker pool on commit."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload()
+
+        patched_get_executor.return_value.submit.assert_called_once_with(
+            _process_in_worker, self.recipe.id
+        )
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    @patch('recipe.images.render_variants')
+    def test_upload_image_processing_failed(self, patched_render):
+        """Test a processing error marks the image failed."""
+        patched_render.side_effect = OSError
+
+        with self.assertLogs('recipe.images', level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._upload()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    @patch('recipe.images.render_variants')
+    def test_replaced_image_status_kept(self, patched_render):
+        """Test a job for a replaced image leaves the new one alone."""
+        self._upload()
+        self.recipe.refresh_from_db()
+        old_name = self.recipe.image.name
+
+        def replace_image(image_file, name):
+            Recipe.objects.filter(pk=self.recipe.pk).update(
+                image='uploads/recipe/other.jpg',
+                image_status=Recipe.IMAGE_PENDING,
+            )
+            return {}
+        patched_render.side_effect = replace_image
+        process_recipe_image(self.recipe.id)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_PENDING)
+        self.recipe.image.storage.delete(old_name)
@@ -0,0 +1,367 @@
+"""
+Test full-text search of recipes.
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.bulk import import_recipes
+from recipe.pagination import KeysetPagination
+from recipe.search import search_recipes
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
+INGREDIENTS_AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.00'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def vector_writes(ctx):
+    """Return the number of updates of search vectors captured."""
+    return sum(
+        1 for query in ctx.captured_queries
+        if query['sql'].startswith('UPDATE "core_recipe" SET "search_vector"')
+    )
+
+
+def found(terms):
+    """Return the titles of the recipes matching terms."""
+    return set(search_recipes(
+        Recipe.objects.all(), terms
+    ).values_list('title', flat=True))
+
+
+class SearchVectorTests(TestCase):
+    """Test the search vector follows changes to recipes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+
+    def test_title_and_description(self):
+        """Test recipes are found by title and description words."""
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.user, title='Mushroom risotto')
+            create_recipe(
+                self.user, title='Soup', description='With wild mushrooms.'
+            )
+
+        self.assertEqual(found('mushroom'), {'Mushroom risotto', 'Soup'})
+
+    def test_updated_title(self):
+        """Test a recipe is found by its new title only."""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, title='Pancakes')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.title = 'Waffles'
+            recipe.save()
+
+        self.assertEqual(found('pancakes'), set())
+        self.assertEqual(found('waffles'), {'Waffles'})
+
+    def test_tags_and_ingredients(self):
+        """Test recipes are found by their tag and ingredient names."""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, title='Curry')
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+            ingredient = Ingredient.objects.create(
+                user=self.user, name='Lentils',
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        self.assertEqual(found('vegan lentils'), {'Curry'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.remove(tag)
+        self.assertEqual(found('vegan'), set())
+
+    def test_reverse_relations(self):
+        """Test changes made from the tag side update the recipes."""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, title='Curry')
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.recipe_set.add(recipe)
+        self.assertEqual(found('vegan'), {'Curry'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.recipe_set.clear()
+        self.assertEqual(found('vegan'), set())
+
+    def test_renamed_and_deleted_tag(self):
+        """Test renaming or deleting a tag updates its recipes."""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, title='Curry')
+            tag = Tag.objects.create(user=self.user, name='Vegan')
+            recipe.tags.add(tag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = 'Spicy'
+            tag.save()
+        self.assertEqual(found('vegan'), set())
+        self.assertEqual(found('spicy'), {'Curry'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+        self.assertEqual(found('spicy'), set())
+
+    def test_updated_once_per_transaction(self):
+        """Test a recipe changed several times is recomputed once."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, title='Curry')
+            recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                client.patch(url, {
+                    'title': 'Dal', 'tags': [{'name': 'Spicy'}],
+                    'ingredients': [{'name': 'Lentils'}],
+                }, format='json')
+
+        self.assertEqual(vector_writes(ctx), 1)
+        self.assertEqual(found('spicy lentils dal'), {'Dal'})
+
+    def test_not_recomputed_for_other_fields(self):
+        """Test saving fields that aren't searched leaves the vector."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, title='Curry')
+        url = reverse('recipe:recipe-detail', args=[recipe.id])
+
+        with CaptureQueriesContext(connection) as ctx:
+            with self.captureOnCommitCallbacks(execute=True):
+                client.patch(url, {'price': '2.50'})
+
+        self.assertEqual(vector_writes(ctx), 0)
+        self.assertEqual(found('curry'), {'Curry'})
+
+    def test_save_leaves_vector(self):
+        """Test saving a recipe doesn't write back the vector it loaded."""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user, title='Curry')
+        stale = Recipe.objects.get(pk=recipe.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        stale.time_minutes = 20
+        with CaptureQueriesContext(connection) as ctx:
+            stale.save()
+
+        self.assertNotIn('search_vector', ctx.captured_queries[0]['sql'])
+        self.assertEqual(found('vegan'), {'Curry'})
+
+    def test_bulk_import(self):
+        """Test imported recipes are searchable."""
+        import_recipes(self.user, [
+            '{"title": "Curry", "time_minutes": 5, "price": "1.00", '
+            '"tags": [{"name": "Vegan"}]}'
+        ])
+
+        self.assertEqual(found('vegan'), {'Curry'})
+
+
+class SearchApiTests(TestCase):
+    """Test the search parameter of the recipe list."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_ranked_results(self):
+        """Test title matches rank above description matches."""
+        with self.captureOnCommitCallbacks(execute=True):
+            description = create_recipe(
+                self.user, title='Stew', description='Plenty of garlic.'
+            )
+            title = create_recipe(self.user, title='Garlic bread')
+            create_recipe(self.user, title='Salad')
+
+        res = self.client.get(RECIPES_URL, {'search': 'garlic'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in res.data], [title.id, description.id]
+        )
+
+    def test_search_only_own_recipes(self):
+        """Test other users' recipes are not found."""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        create_recipe(other, title='Garlic bread')
+
+        res = self.client.get(RECIPES_URL, {'search': 'garlic'})
+
+        self.assertEqual(res.data, [])
+
+    def test_search_syntax(self):
+        """Test phrases and exclusions in the search terms."""
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.user, title='Garlic bread')
+            create_recipe(self.user, title='Bread with garlic butter')
+
+        res = self.client.get(RECIPES_URL, {'search': '"garlic bread"'})
+        self.assertEqual([r['title'] for r in res.data], ['Garlic bread'])
+
+        res = self.client.get(RECIPES_URL, {'search': 'garlic -butter'})
+        self.assertEqual([r['title'] for r in res.data], ['Garlic bread'])
+
+    def test_search_paginated(self):
+        """Test paging through ranked results visits every match once."""
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(5):
+                create_recipe(
+                    self.user,
+                    title='Garlic ' * (i + 1),
+                    description=f'Recipe {i}',
+                )
+
+        ids = []
+        params = {'search': 'garlic', 'page_size': 2}
+        url = RECIPES_URL
+        while url:
+            res = self.client.get(url, params)
+            ids += [r['id'] for r in res.data['results']]
+            url, params = res.data['next'], None
+
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_search_paginated_past_offset_cutoff(self):
+        """Test paging through more equal ranks than a cursor offset allows."""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes = [
+                create_recipe(self.user, title='Garlic soup')
+                for _ in range(5)
+            ]
+            create_recipe(self.user, title='Garlic garlic soup')
+
+        ids = []
+        params = {'search': 'garlic', 'page_size': 2}
+        url = RECIPES_URL
+        with patch.object(KeysetPagination, 'offset_cutoff', 2):
+            while url:
+                res = self.client.get(url, params)
+                ids += [r['id'] for r in res.data['results']]
+                url, params = res.data['next'], None
+
+        self.assertEqual(
+            ids[1:], [recipe.id for recipe in reversed(recipes)],
+        )
+
+
+@override_settings(RECIPE_LIST_CACHE_ALIAS='default')
+class AutocompleteApiTests(TestCase):
+    """Test suggesting tag and ingredient names."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _suggest(self, q, url=INGREDIENTS_AUTOCOMPLETE_URL, **params):
+        res = self.client.get(url, {'q': q, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data]
+
+    def test_prefix_first(self):
+        """Test names starting with the prefix come before others."""
+        for name in ('Cherry tomato', 'Tomato', 'Potato', 'Tomatillo'):
+            Ingredient.objects.create(user=self.user, name=name)
+
+        self.assertEqual(
+            self._suggest('tom'), ['Tomato', 'Tomatillo', 'Cherry tomato']
+        )
+
+    def test_similar_names(self):
+        """Test names similar to a misspelt prefix are suggested."""
+        Ingredient.objects.create(user=self.user, name='Tomato')
+
+        self.assertEqual(self._suggest('tomatoe'), ['Tomato'])
+
+    def test_wildcards_are_literal(self):
+        """Test LIKE wildcards in the prefix only match themselves."""
+        Tag.objects.create(user=self.user, name='100% rye')
+        Tag.objects.create(user=self.user, name='Bread')
+
+        self.assertEqual(
+            self._suggest('%', TAGS_AUTOCOMPLETE_URL), ['100% rye']
+        )
+
+    def test_limit_and_user(self):
+        """Test only the user's names are suggested, up to the limit."""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        Tag.objects.create(user=other, name='Dinner')
+        for name in ('Dinner', 'Dinner party', 'Dinner for two'):
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'din', 'limit': 2})
+
+        self.assertEqual(len(res.data), 2)
+        self.assertEqual(set(res.data[0]), {'id', 'name'})
+        self.assertEqual(
+            res.data[0]['id'],
+            Tag.objects.get(user=self.user, name='Dinner').id,
+        )
+
+    def test_blank_prefix(self):
+        """Test nothing is suggested without a prefix."""
+        Tag.objects.create(user=self.user, name='Dinner')
+
+        self.assertEqual(self._suggest(' ', TAGS_AUTOCOMPLETE_URL), [])
+
+    def test_cached_until_changed(self):
+        """Test suggestions are cached until the user changes a name."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        self._suggest('din', TAGS_AUTOCOMPLETE_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TAGS_AUTOCOMPLETE_URL, {'q': 'din'})
+        self.assertIn('max-age', res['Cache-Control'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='Dinner party')
+        self.assertEqual(
+            self._suggest('din', TAGS_AUTOCOMPLETE_URL),
+            ['Dinner', 'Dinner party'],
+        )
@@ -2,14 +2,19 @@
 Test tags api.
 
 """
+import json
+import threading
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 
 from rest_framework import status
+from rest_framework.pagination import Cursor
 from rest_framework.test import APIClient
+from recipe.pagination import KeysetPagination
 from recipe.serializers import TagSerializer
 from core.models import Tag, Recipe
 
@@ -92,6 +97,20 @@ class PrivateTagsApiTests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_existing_name_error(self):
+        """
+        Test renaming a tag to a name the user already has fails.
+        """
+        Tag.objects.create(user=self.user, name='Lunch')
+        tag = Tag.objects.create(user=self.user, name='After dinner')
+        payload = {'name': 'Lunch'}
+        url = detail_url(tag.id)
+        res = self.client.patch(url, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'After dinner')
+
     def test_delete_api(self):
         """
         Test deleting tags.
@@ -119,6 +138,7 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
+        tag1.refresh_from_db()
         s1 = TagSerializer(tag1)
         s2 = TagSerializer(tag2)
         self.assertIn(s1.data, res.data)
@@ -145,4 +165,129 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
\ No newline at end of file
+        self.assertEqual(len(res.data), 1)
+
+    def test_tags_paginated(self):
+        """Test tags can be paged through by name."""
+        Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Dinner')
+        Tag.objects.create(user=self.user, name='Lunch')
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        names = [t['name'] for t in res.data['results']]
+        res = self.client.get(res.data['next'])
+        names += [t['name'] for t in res.data['results']]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(names, ['Lunch', 'Dinner', 'Breakfast'])
+
+    def _create_recipe(self, title='Sample recipe'):
+        return Recipe.objects.create(
+            title=title,
+            time_minutes=5,
+            price=Decimal('5.00'),
+            user=self.user,
+        )
+
+    def test_recipe_count_follows_changes(self):
+        """Test the number of recipes of a tag is kept up to date."""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe1 = self._create_recipe()
+        recipe2 = self._create_recipe()
+
+        def count():
+            tag.refresh_from_db()
+            return tag.recipe_count
+
+        recipe1.tags.add(tag)
+        recipe2.tags.add(tag)
+        self.assertEqual(count(), 2)
+        recipe1.tags.remove(tag)
+        self.assertEqual(count(), 1)
+        recipe2.tags.clear()
+        self.assertEqual(count(), 0)
+        tag.recipe_set.add(recipe1, recipe2)
+        self.assertEqual(count(), 2)
+        recipe1.delete()
+        self.assertEqual(count(), 1)
+
+    def test_order_by_recipe_count(self):
+        """Test listing the most used tags first, then by name."""
+        tags = {
+            name: Tag.objects.create(user=self.user, name=name)
+            for name in ('Breakfast', 'Dinner', 'Lunch')
+        }
+        for _ in range(2):
+            self._create_recipe().tags.add(tags['Dinner'], tags['Lunch'])
+        self._create_recipe().tags.add(tags['Dinner'])
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+
+        self.assertEqual(
+            [(t['name'], t['recipe_count']) for t in res.data],
+            [('Dinner', 3), ('Lunch', 2), ('Breakfast', 0)],
+        )
+
+    def test_cursor_invalid_recipe_count(self):
+        """Test a cursor with a recipe count that isn't one is rejected."""
+        paginator = KeysetPagination()
+        paginator.base_url = f'{TAGS_URL}?ordering=recipe_count'
+        url = paginator.encode_cursor(
+            Cursor(0, False, json.dumps(['x', 'y']))
+        )
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_ordering_invalid(self):
+        """Test ordering by a field that isn't allowed is rejected."""
+        res = self.client.get(TAGS_URL, {'ordering': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipe_count_not_nested(self):
+        """Test tags nested in a recipe leave out the recipe count."""
+        recipe = self._create_recipe()
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Lunch'))
+
+        res = self.client.get(
+            reverse('recipe:recipe-detail', args=[recipe.id])
+        )
+
+        self.assertEqual(set(res.data['tags'][0]), {'id', 'name'})
+
+
+class RecipeCountConcurrencyTests(TransactionTestCase):
+    """Test recipe counts of concurrent changes."""
+
+    def test_concurrent_additions_counted(self):
+        """Test tags added to recipes in two transactions count both."""
+        user = create_user()
+        tag = Tag.objects.create(user=user, name='Vegan')
+        recipe1, recipe2 = (
+            Recipe.objects.create(
+                title=title, time_minutes=5, price=Decimal('5.00'), user=user,
+            )
+            for title in ('Soup', 'Stew')
+        )
+        added = threading.Event()
+        commit = threading.Event()
+
+        def add():
+            with transaction.atomic():
+                recipe1.tags.add(tag)
+                added.set()
+                commit.wait(5)
+            connection.close()
+
+        thread = threading.Thread(target=add)
+        thread.start()
+        added.wait(5)
+        # Commits the other transaction while this one waits for it.
+        threading.Timer(0.2, commit.set).start()
+        recipe2.tags.add(tag)
+        thread.join()
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 2)
@@ -0,0 +1,93 @@
+"""
+Tests for streaming recipe image uploads.
+"""
+import io
+import struct
+import zlib
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from recipe.uploads import (
+    HEADER_SIZE,
+    ImageHeaderValidator,
+    ImageRejected,
+    parse_content_range,
+)
+
+
+def png_chunk(chunk_type, data=b''):
+    """Return a PNG chunk."""
+    chunk = chunk_type + data
+    return (
+        struct.pack('>I', len(data)) + chunk +
+        struct.pack('>I', zlib.crc32(chunk))
+    )
+
+
+def png_header(width, height):
+    """Return the start of a PNG of the given size, up to its pixels."""
+    return b'\x89PNG\r\n\x1a\n' + png_chunk(
+        b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    ) + png_chunk(b'IDAT')
+
+
+class ImageHeaderValidatorTests(SimpleTestCase):
+    """Test checking images from the start of their file."""
+
+    def test_header_over_chunks(self):
+        """Test the header is read once enough chunks have arrived."""
+        data = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(data, format='PNG')
+        header = data.getvalue()
+        validator = ImageHeaderValidator()
+
+        validator.feed(header[:10])
+        self.assertIsNone(validator.format)
+        validator.feed(header[10:])
+
+        self.assertEqual(validator.format, 'PNG')
+        self.assertIsNone(validator.header)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=10 ** 6)
+    def test_decompression_bomb(self):
+        """Test a small file of huge dimensions is rejected from its header."""
+        validator = ImageHeaderValidator()
+
+        with self.assertRaisesMessage(ImageRejected, 'too many pixels'):
+            validator.feed(png_header(100000, 100000))
+
+    def test_not_image(self):
+        """Test data that never forms an image header is rejected."""
+        validator = ImageHeaderValidator()
+
+        with self.assertRaises(ImageRejected):
+            validator.feed(b'x' * HEADER_SIZE)
+
+    def test_format_not_allowed(self):
+        """Test images in formats not configured are rejected."""
+        data = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(data, format='BMP')
+        validator = ImageHeaderValidator()
+        validator.feed(data.getvalue())
+
+        with self.assertRaises(ImageRejected):
+            validator.close()
+
+
+class ContentRangeTests(SimpleTestCase):
+    """Test parsing the byte range of a resumable upload."""
+
+    def test_range(self):
+        self.assertEqual(parse_content_range('bytes 0-99/200'), (0, 99, 200))
+
+    def test_status_query(self):
+        self.assertEqual(
+            parse_content_range('bytes */200'), (None, None, 200)
+        )
+
+    def test_invalid(self):
+        for header in (None, 'bytes 5-1/10', 'bytes 0-10/10', 'items 0-1/2'):
+            with self.subTest(header=header):
+                with self.assertRaises(ValueError):
+                    parse_content_range(header)
@@ -0,0 +1,364 @@
+"""
+Streaming upload of recipe images.
+
+Uploaded images are written chunk by chunk straight into storage instead
+of being buffered in memory or a temporary file and then copied, and
+hashed on the way for their content addressed name. The image header is
+checked as it arrives, so files that are too large, are not an image or
+would decode to too many pixels are rejected before anything decodes
+them.
+
+Large images can also be uploaded in several requests, each carrying a
+byte range of the file, and resumed from the last byte stored.
+"""
+import fcntl
+import hashlib
+import io
+import os
+import re
+import uuid
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+
+from core.models import Recipe, recipe_image_file_path
+
+# Bytes of the file kept in memory to read the image header from.
+HEADER_SIZE = 256 * 2 ** 10
+
+# Directory of uploads still being received.
+PARTIAL_DIR = os.path.join('uploads', 'recipe', 'partial')
+
+# Extension of the stored file for each format.
+FORMAT_EXTENSIONS = {
+    'GIF': '.gif',
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'WEBP': '.webp',
+}
+
+
+class ImageRejected(Exception):
+    """The uploaded file is not an acceptable image."""
+
+
+def get_storage():
+    """Return the storage recipe images are saved to."""
+    return Recipe._meta.get_field('image').storage
+
+
+def store_image(temp_name, image_format, digest):
+    """Move an image written to storage to its content addressed name."""
+    name = recipe_image_file_path(
+        None, 'image' + FORMAT_EXTENSIONS.get(image_format, '')
+    )
+
+    return get_storage().store(temp_name, name, digest)
+
+
+class ImageHeaderValidator:
+    """
+    Check an image from the start of its file, fed to it in chunks.
+
+    The chunks are buffered only until the header can be read, which
+    gives the format and dimensions without decoding any pixels.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.header = io.BytesIO()
+        self.format = None
+
+    def feed(self, data):
+        """Check the next chunk of the file."""
+        self.size += len(data)
+        if self.size > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            raise ImageRejected(
+                f'The image is larger than '
+                f'{settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE} bytes.'
+            )
+        if self.format is None:
+            self.header.write(data[:HEADER_SIZE - self.header.tell()])
+            self._read_header(final=self.header.tell() >= HEADER_SIZE)
+
+    def close(self):
+        """Check the file has been recognised as an image."""
+        if self.format is None:
+            self._read_header(final=True)
+
+    def _read_header(self, final):
+        """Read the header, failing if it is still incomplete when final."""
+        self.header.seek(0)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                image = Image.open(
+                    self.header,
+                    formats=settings.RECIPE_IMAGE_FORMATS,
+                )
+        except Image.DecompressionBombError:
+            raise ImageRejected('The image has too many pixels.')
+        except OSError:
+            if final:
+                raise ImageRejected(
+                    'Upload a valid image. The file you uploaded was either '
+                    'not an image or a corrupted image.'
+                )
+            return
+        finally:
+            self.header.seek(0, io.SEEK_END)
+
+        if image.width * image.height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise ImageRejected('The image has too many pixels.')
+        self.format = image.format
+        self.header = None
+
+
+class StreamedImage:
+    """An image upload already saved to storage under its final name."""
+
+    def __init__(self, name, size=0, error=None):
+        self.name = name
+        self.size = size
+        self.error = error
+
+    def __repr__(self):
+        return f'<StreamedImage: {self.name}>'
+
+
+def verify_stored_image(name):
+    """Check the structure of a stored image, reading it from storage."""
+    try:
+        with get_storage().open(name, 'rb') as image_file:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+                Image.open(
+                    image_file, formats=settings.RECIPE_IMAGE_FORMATS
+                ).verify()
+    except Exception:
+        raise ImageRejected(
+            'Upload a valid image. The file you uploaded was either '
+            'not an image or a corrupted image.'
+        )
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """
+    Upload handler writing the `image` field straight into storage.
+
+    Other fields are left to the following handlers. The image comes out
+    of `request.FILES` as a StreamedImage, with its error set and the
+    partial file removed if it was rejected.
+    """
+
+    field_name = 'image'
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.activated = field_name == self.field_name
+        if not self.activated:
+            return
+
+        self.temp_name = os.path.join(PARTIAL_DIR, f'{uuid.uuid4().hex}.part')
+        path = get_storage().path(self.temp_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.file = open(path, 'xb')
+        self.digest = hashlib.sha256()
+        self.validator = ImageHeaderValidator()
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated:
+            return raw_data
+        if self.error is None:
+            try:
+                self.validator.feed(raw_data)
+            except ImageRejected as error:
+                self._reject(error)
+            else:
+                self.file.write(raw_data)
+                self.digest.update(raw_data)
+
+        return None
+
+    def file_complete(self, file_size):
+        if not self.activated:
+            return None
+
+        if self.error is None:
+            self.file.close()
+            try:
+                self.validator.close()
+                verify_stored_image(self.temp_name)
+            except ImageRejected as error:
+                self._reject(error)
+            else:
+                return StreamedImage(store_image(
+                    self.temp_name,
+                    self.validator.format,
+                    self.digest.hexdigest(),
+                ), file_size)
+
+        return StreamedImage(None, file_size, self.error)
+
+    def upload_interrupted(self):
+        if getattr(self, 'activated', False) and self.error is None:
+            self._reject(ImageRejected('The upload was interrupted.'))
+
+    def _reject(self, error):
+        """Stop storing the file and remove what was written."""
+        self.error = str(error)
+        self.file.close()
+        get_storage().delete(self.temp_name)
+
+
+CONTENT_RANGE_RE = re.compile(
+    r'^bytes (?:(?P<start>\d+)-(?P<end>\d+)|\*)/(?P<total>\d+)$'
+)
+
+
+def parse_content_range(header):
+    """
+    Parse the Content-Range header of a chunk of a resumable upload.
+
+    Returns a (start, end, total) tuple of ints, with start and end None
+    for a `bytes */total` status query. Raises ValueError when invalid.
+    """
+    match = CONTENT_RANGE_RE.match(header or '')
+    if match is None:
+        raise ValueError('Content-Range must be "bytes start-end/total".')
+
+    total = int(match['total'])
+    if match['start'] is None:
+        return None, None, total
+
+    start, end = int(match['start']), int(match['end'])
+    if not start <= end < total:
+        raise ValueError('Content-Range is outside of the file.')
+
+    return start, end, total
+
+
+class ResumableUpload:
+    """
+    An image uploaded in byte ranges over several requests.
+
+    The bytes received so far are kept in a partial file per recipe, so
+    its size is the offset the next range has to start at.
+    """
+
+    chunk_size = FileUploadHandler.chunk_size
+
+    def __init__(self, recipe):
+        self.recipe = recipe
+        self.name = os.path.join(PARTIAL_DIR, f'{recipe.pk}.part')
+        self.path = get_storage().path(self.name)
+
+    @property
+    def offset(self):
+        """Return the number of bytes received so far."""
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def write(self, stream, start, end, total):
+        """
+        Append the range start-end of the file, read from stream.
+
+        Returns the new offset. Raises ImageRejected for files that are
+        not acceptable, which discards the upload, and ValueError for
+        ranges that don't follow on from the bytes already received.
+        """
+        if total > settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE:
+            self.discard()
+            raise ImageRejected(
+                f'The image is larger than '
+                f'{settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE} bytes.'
+            )
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Read-write rather than appending, whose position doesn't follow
+        # a truncation, opened without truncating like 'w' would.
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        with open(fd, 'r+b') as partial:
+            try:
+                fcntl.flock(partial, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise ValueError('Another range is being uploaded.')
+
+            if start == 0:
+                partial.truncate(0)
+            elif start != partial.seek(0, os.SEEK_END):
+                raise ValueError(
+                    f'The range must start at byte {partial.tell()}.'
+                )
+
+            validator = self._validator(start)
+            remaining = end - start + 1
+            try:
+                while remaining:
+                    data = b''
+                    if stream is not None:
+                        data = stream.read(min(self.chunk_size, remaining))
+                    if not data:
+                        partial.truncate(start)
+                        raise ValueError('The body is shorter than the range.')
+                    if validator is not None:
+                        validator.feed(data)
+                    partial.write(data)
+                    remaining -= len(data)
+            except ImageRejected:
+                partial.truncate(0)
+                self.discard()
+                raise
+
+            partial.flush()
+
+        return self.offset
+
+    def _validator(self, start):
+        """Return a validator primed with the bytes received before start."""
+        if start >= HEADER_SIZE:
+            # The header was checked with an earlier range.
+            return None
+
+        validator = ImageHeaderValidator()
+        with open(self.path, 'rb') as partial:
+            validator.feed(partial.read(start))
+
+        return validator
+
+    def complete(self):
+        """
+        Move the finished upload to its final name in storage.
+
+        The ranges may have come to different processes, so the file is
+        hashed here in one more pass rather than as it was received.
+        """
+        try:
+            validator = ImageHeaderValidator()
+            with open(self.path, 'rb') as partial:
+                validator.feed(partial.read(HEADER_SIZE))
+            validator.close()
+            verify_stored_image(self.name)
+        except ImageRejected as error:
+            self.discard()
+            return StreamedImage(None, error=str(error))
+
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as partial:
+            for data in iter(lambda: partial.read(self.chunk_size), b''):
+                digest.update(data)
+        size = self.offset
+
+        return StreamedImage(
+            store_image(self.name, validator.format, digest.hexdigest()),
+            size,
+        )
+
+    def discard(self):
+        """Remove the bytes received so far."""
+        get_storage().delete(self.name)
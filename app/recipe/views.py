@@ -1,4 +1,13 @@
 """View for the list of recipie apis."""
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -13,12 +22,49 @@ from rest_framework import(
 )
 
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.authentication import CachedTokenAuthentication
 from core.models import Recipe, Tag, Ingredient
+from core.renderers import ORJSONRenderer
 from recipe import serializers
+from recipe.bulk import export_recipes, import_recipes
+from recipe.cache import CachedListMixin, get_or_set_user_data
+from recipe.images import enqueue_image_processing
+from recipe.listing import (
+    FIELD_COLUMNS,
+    list_columns,
+    list_fields,
+    RecipeRows,
+    RELATIONS,
+)
+from recipe.pagination import KeysetPagination
+from recipe.renderers import CSVRenderer, NDJSONRenderer
+from recipe.replicas import ReplicaReadMixin
+from recipe.search import search_recipes, suggest_names
+from recipe.uploads import (
+    ImageRejected,
+    parse_content_range,
+    ResumableUpload,
+    StreamingImageUploadHandler,
+)
+
+
+def recipe_etag(pk, version, media_type, fields=None):
+    """
+    Return the strong ETag of a version of a recipe.
+
+    Responses in each media type, and with only some of the fields, have
+    ETags of their own, as their bodies differ.
+    """
+    variant = media_type
+    if fields is not None:
+        variant = f'{variant};{",".join(fields)}'
+
+    digest = hashlib.md5(variant.encode()).hexdigest()[:8]
+    return f'"recipe-{pk}-v{version}-{digest}"'
 
 
 
@@ -27,15 +73,44 @@ from recipe import serializers
         parameters=[
             OpenApiParameter('tags', OpenApiTypes.STR, description='Comma separated list of tags.'),
             OpenApiParameter('ingredients', OpenApiTypes.STR, description='Comma separated list of ingredients.'),
+            OpenApiParameter('match', OpenApiTypes.STR, enum=['any', 'all'], description='Match recipes with any (default) or all of the tags and ingredients.'),
+            OpenApiParameter('search', OpenApiTypes.STR, description='Full-text search of titles, descriptions, tags and ingredients, best matches first.'),
+            OpenApiParameter('min_time', OpenApiTypes.INT, description='Shortest time in minutes.'),
+            OpenApiParameter('max_time', OpenApiTypes.INT, description='Longest time in minutes.'),
+            OpenApiParameter('min_price', OpenApiTypes.DECIMAL, description='Lowest price.'),
+            OpenApiParameter('max_price', OpenApiTypes.DECIMAL, description='Highest price.'),
+            OpenApiParameter('ordering', OpenApiTypes.STR, enum=['id', '-id', 'time_minutes', '-time_minutes', 'price', '-price'], description='Order of the recipes, newest first by default.'),
+            OpenApiParameter('fields', OpenApiTypes.STR, description='Comma separated list of the fields to return.'),
+            OpenApiParameter('exclude', OpenApiTypes.STR, description='Comma separated list of the fields to leave out.'),
         ]
-    )
+    ),
+    retrieve=extend_schema(
+        parameters=[
+            OpenApiParameter('fields', OpenApiTypes.STR, description='Comma separated list of the fields to return.'),
+            OpenApiParameter('exclude', OpenApiTypes.STR, description='Comma separated list of the fields to leave out.'),
+        ]
+    ),
 )
-class RecipeViewset(viewsets.ModelViewSet):
+class RecipeViewset(ReplicaReadMixin, CachedListMixin, viewsets.ModelViewSet):
     """Viewset for manage recipe apis."""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
+    pagination_class = KeysetPagination
+    ordering = ('-id',)
+    ordering_fields = ('id', 'time_minutes', 'price')
+    """Fields the list can be ordered by, each with an index per user."""
+    range_filters = {
+        'time_minutes': ('min_time', 'max_time'),
+        'price': ('min_price', 'max_price'),
+    }
+    """Query parameters of the bounds of each field."""
+    field_columns = {
+        **FIELD_COLUMNS,
+        'image_variants': 'image_variants',
+    }
+    """Columns read by the detail fields that aren't columns."""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def _params_to_ints(self, qs):
@@ -43,22 +118,180 @@ class RecipeViewset(viewsets.ModelViewSet):
 
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _filter_related(self, queryset, field, ids, match):
+        """
+        Filter recipes linked to any or all of ids through an m2m field.
+
+        Each condition is a correlated EXISTS on the through table, so
+        recipes are never joined to their tags and need no DISTINCT.
+        """
+        through = Recipe._meta.get_field(field).remote_field.through
+        target = Recipe._meta.get_field(field).m2m_reverse_field_name()
+        related = through.objects.filter(recipe=OuterRef('pk'))
+
+        if match == 'any':
+            return queryset.filter(
+                Exists(related.filter(**{f'{target}__in': ids}))
+            )
+        for related_id in set(ids):
+            queryset = queryset.filter(
+                Exists(related.filter(**{target: related_id}))
+            )
+
+        return queryset
+
+    def _filter_ranges(self, queryset):
+        """
+        Filter recipes to the bounds given in the query parameters.
+
+        Bounds are cleaned by the model field, so they are finite values
+        the column can hold.
+        """
+        params = self.request.query_params
+        for field, (low, high) in self.range_filters.items():
+            model_field = Recipe._meta.get_field(field)
+            for param, lookup in ((low, 'gte'), (high, 'lte')):
+                if param not in params:
+                    continue
+                try:
+                    value = model_field.clean(params[param], None)
+                except DjangoValidationError as error:
+                    raise ValidationError({param: error.messages})
+                queryset = queryset.filter(**{f'{field}__{lookup}': value})
+
+        return queryset
+
     def get_queryset(self):
         """Return objects for the authenticated user."""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Must be one of: any, all.'})
+
         queryset = self.queryset
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = self._filter_related(queryset, 'tags', tag_ids, match)
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = self._filter_related(
+                queryset, 'ingredients', ingredient_ids, match
+            )
 
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
+        queryset = self._filter_ranges(
+            queryset.filter(user=self.request.user)
+        )
+        if self._search_terms():
+            queryset = search_recipes(queryset, self._search_terms())
+        queryset = queryset.order_by(*self.get_ordering())
+
+        return self._load_relations(queryset)
+
+    def _search_terms(self):
+        """Return the search terms of a list or export, if any."""
+        if self.action not in ('list', 'bulk_export'):
+            return None
+
+        return self.request.query_params.get('search', '').strip() or None
 
+    def get_ordering(self):
+        """
+        Return the ordering asked for, else best matches first when
+        searching, else the newest first, or the oldest for exports.
+
+        Orderings end in the id in the same direction, so they can be
+        read in order from the indexes, and pages seek past ties.
+        """
+        ordering = self.request.query_params.get('ordering')
+        if ordering and self.action in ('list', 'bulk_export'):
+            choices = [
+                f'{prefix}{field}'
+                for field in self.ordering_fields for prefix in ('', '-')
+            ]
+            if ordering not in choices:
+                raise ValidationError(
+                    {'ordering': f'Must be one of: {", ".join(choices)}.'}
+                )
+            prefix = '-' if ordering.startswith('-') else ''
+            return tuple(dict.fromkeys((ordering, f'{prefix}id')))
+        if self._search_terms():
+            return ('-rank', '-id')
+        if self.action == 'bulk_export':
+            return ('id',)
+
+        return self.ordering
+
+    def _load_relations(self, queryset):
+        """Load what the current action renders in a fixed number of queries."""
+
+        if self.action == 'upload_image':
+            return queryset.only(
+                'id', 'user', 'image', 'image_status', 'image_variants',
+                'version',
+            )
+        if self.action in ('destroy', 'bulk_export'):
+            return queryset
+        if self.action == 'list':
+            return self._load_rows(queryset)
+        if self.action == 'retrieve':
+            return self._load_fields(queryset)
+
+        return self._prefetch(queryset, RELATIONS)
+
+    def _prefetch(self, queryset, relations):
+        """Prefetch relations of the recipes, in id order like the list."""
+        return queryset.prefetch_related(*(
+            Prefetch(field, queryset=Recipe._meta.get_field(
+                field
+            ).related_model.objects.order_by('id'))
+            for field in relations
+        ))
+
+    def _load_rows(self, queryset):
+        """
+        Load the list as `.values()` rows of the columns to be rendered,
+        see recipe.listing.
+
+        The cursor reads the ordering whatever the fields.
+        """
+        columns = list_columns(list_fields(self.request))
+        columns.update(field.lstrip('-') for field in self.get_ordering())
+
+        return queryset.values(*columns)
+
+    def _load_fields(self, queryset):
+        """
+        Load only the columns and relations of the fields to be rendered.
+
+        The version headers read the version and modification time
+        whatever the fields.
+        """
+        fields = (
+            self._sparse_fields() or
+            self.get_serializer_class().Meta.fields
+        )
+        relations = [field for field in RELATIONS if field in fields]
+        columns = {'id', 'version', 'updated_at'}
+        columns.update(
+            self.field_columns.get(field, field) for field in fields
+            if field not in relations
+        )
+
+        return self._prefetch(queryset.only(*columns), relations)
+
+    def _sparse_fields(self):
+        """Return the fields the response is narrowed to, if any."""
+        return serializers.sparse_fields(
+            self.request, self.get_serializer_class().Meta.fields
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer, or the rows of the list's fast path."""
+        if self.action == 'list' and kwargs.get('many'):
+            return RecipeRows(*args, context=self.get_serializer_context())
+
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
         """Return serializer class for request."""
@@ -74,40 +307,239 @@ class RecipeViewset(viewsets.ModelViewSet):
         """Create a new recipe object."""
         serializers.save(user=self.request.user)
 
+    def _is_conditional(self):
+        """Return whether the request has conditional headers."""
+        return any(header in self.request.META for header in (
+            'HTTP_IF_MATCH',
+            'HTTP_IF_NONE_MATCH',
+            'HTTP_IF_MODIFIED_SINCE',
+            'HTTP_IF_UNMODIFIED_SINCE',
+        ))
+
+    def _conditional_response(self, lock=False):
+        """
+        Evaluate the conditional request headers for the recipe.
+
+        Only the version and modification time are read, with one lookup
+        on the primary key. Returns a 304/412 response, or None when the
+        request should go ahead.
+        """
+        if not self._is_conditional():
+            return None
+
+        queryset = Recipe.objects.filter(
+            user=self.request.user,
+            pk=self.kwargs['pk'],
+        )
+        if lock:
+            queryset = queryset.select_for_update()
+        try:
+            row = queryset.values_list('pk', 'version', 'updated_at').first()
+        except (TypeError, ValueError, DjangoValidationError):
+            row = None
+        if row is None:
+            # Let the regular lookup return the not found response.
+            return None
+
+        pk, version, updated_at = row
+        response = get_conditional_response(
+            self.request,
+            etag=self._etag(pk, version),
+            last_modified=int(updated_at.timestamp()),
+        )
+        if response is not None:
+            self._set_version_headers(response, pk, version, updated_at)
+        return response
+
+    def _etag(self, pk, version):
+        """Return the ETag of the response to the request for a recipe."""
+        return recipe_etag(
+            pk,
+            version,
+            self.request.accepted_renderer.media_type,
+            self._sparse_fields(),
+        )
+
+    def _set_version_headers(self, response, pk, version, updated_at):
+        """Set the ETag and Last-Modified headers of a recipe response."""
+        response['ETag'] = self._etag(pk, version)
+        response['Last-Modified'] = http_date(updated_at.timestamp())
+        patch_vary_headers(response, ('Accept',))
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a recipe unless the client's copy is current."""
+        response = self._conditional_response()
+        if response is not None:
+            return response
+
+        response = super().retrieve(request, *args, **kwargs)
+        recipe = self._recipe
+        self._set_version_headers(
+            response, recipe.pk, recipe.version, recipe.updated_at
+        )
+        return response
+
+    def update(self, request, *args, **kwargs):
+        """Update a recipe if it still matches the client's If-Match."""
+        if not self._is_conditional():
+            response = super().update(request, *args, **kwargs)
+        else:
+            # Lock the row so the version can't change before the update.
+            with transaction.atomic():
+                response = self._conditional_response(lock=True)
+                if response is not None:
+                    return response
+
+                response = super().update(request, *args, **kwargs)
+
+        recipe = self._recipe
+        self._set_version_headers(
+            response, recipe.pk, recipe.version, recipe.updated_at
+        )
+        return response
+
+    def get_object(self):
+        """Return the recipe, keeping it for the version headers."""
+        self._recipe = super().get_object()
+        return self._recipe
+
     # Custom actions
-    @action(methods=['POST'], detail=True, url_path='upload-image')
+    @action(methods=['POST', 'PUT'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Upload an image to a recipe."""
+        """
+        Upload an image to a recipe.
+
+        A POST uploads the whole image as multipart form data. A PUT
+        uploads the byte range of the image given by its Content-Range
+        header as the raw body, so a large image can be sent in several
+        requests and resumed after a failure.
+        """
         recipe = self.get_object()
-        serializer = self.get_serializer(
-            recipe,
-            data=request.data
-        )
+        if request.method == 'PUT':
+            upload = ResumableUpload(recipe)
+            try:
+                start, end, total = parse_content_range(
+                    request.META.get('HTTP_CONTENT_RANGE')
+                )
+                offset = upload.offset
+                if start is not None:
+                    offset = upload.write(request.stream, start, end, total)
+            except ImageRejected as error:
+                return Response(
+                    {'image': [str(error)]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            except ValueError as error:
+                return self._upload_offset_response(
+                    offset=upload.offset,
+                    data={'detail': str(error)},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if offset < total:
+                return self._upload_offset_response(
+                    offset=offset,
+                    status=status.HTTP_202_ACCEPTED,
+                )
+            data = {'image': upload.complete()}
+        else:
+            # Stream the image to storage rather than buffering it.
+            request.upload_handlers.insert(
+                0, StreamingImageUploadHandler(request)
+            )
+            data = request.data
+
+        serializer = self.get_serializer(recipe, data=data)
 
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(
+                image_status=Recipe.IMAGE_PENDING,
+                image_variants={},
+            )
+            enqueue_image_processing(recipe.id)
             return Response(
                 serializer.data,
                 status=status.HTTP_200_OK
             )
-        
+
         return Response(serializer.errors,status=status.HTTP_400_BAD_REQUEST)
-    
+
+    @action(methods=['POST'], detail=False, url_path='import')
+    def bulk_import(self, request):
+        """
+        Create recipes from a JSON Lines body, one recipe per line.
+
+        The body is read a line at a time rather than parsed as a whole.
+        Invalid lines are skipped and reported with the number created.
+        """
+        lines = request.stream or []
+        result = import_recipes(request.user, lines)
+        response_status = status.HTTP_201_CREATED
+        if result.invalid and not result.created:
+            response_status = status.HTTP_400_BAD_REQUEST
+
+        return Response(result.as_dict(), status=response_status)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='export',
+        renderer_classes=[NDJSONRenderer, ORJSONRenderer, CSVRenderer],
+    )
+    def bulk_export(self, request):
+        """
+        Stream the user's recipes as JSON Lines, a JSON array or CSV.
+
+        The format is negotiated from the Accept header or `format` query
+        parameter, and the recipes are filtered like the list. They are
+        read and encoded in batches as the response is sent, so memory
+        use doesn't grow with the number of recipes.
+        """
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+
+        response = StreamingHttpResponse(
+            export_recipes(self.get_queryset(), renderer.format),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{renderer.format}"'
+        )
+        return response
+
+    def _upload_offset_response(self, offset, **kwargs):
+        """Return a response giving the bytes received of an upload."""
+        response = Response(**kwargs)
+        if offset:
+            response['Range'] = f'bytes=0-{offset - 1}'
+
+        return response
+
 
 @extend_schema_view(
     list=extend_schema(
         parameters=[
            OpenApiParameter('assigned_only', OpenApiTypes.INT, enum=[0, 1], description='Filter by items assigned to recipes.',),
+           OpenApiParameter('ordering', OpenApiTypes.STR, enum=['name', '-name', 'recipe_count', '-recipe_count'], description='Order by name or number of recipes, -name by default.'),
+           OpenApiParameter('fields', OpenApiTypes.STR, description='Comma separated list of the fields to return.'),
+           OpenApiParameter('exclude', OpenApiTypes.STR, description='Comma separated list of the fields to leave out.'),
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.ListModelMixin, 
+class BaseRecipeAttrViewSet(ReplicaReadMixin,
+                                CachedListMixin,
+                                mixins.ListModelMixin,
                                 mixins.UpdateModelMixin,
                                 mixins.DestroyModelMixin, 
                                 viewsets.GenericViewSet):
     """Base class for recipe attributes."""
 
-    authentication_classes = [TokenAuthentication]
+    pagination_class = KeysetPagination
+    ordering = ('-name',)
+    ordering_fields = ('name', 'recipe_count')
+
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -117,11 +549,90 @@ class BaseRecipeAttrViewSet(mixins.ListModelMixin,
         )
         queryset = self.queryset
         if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+            queryset = queryset.filter(recipe_count__gt=0)
 
-        return queryset.filter(
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-name').distinct()
+        ).order_by(*self.get_ordering())
+        if self.action == 'list':
+            fields = serializers.sparse_fields(
+                self.request, self.get_serializer_class().Meta.fields
+            )
+            if fields is not None:
+                # The cursor reads the ordering whatever the fields.
+                queryset = queryset.only('id', *fields, *(
+                    field.lstrip('-') for field in self.get_ordering()
+                ))
+
+        return queryset
+
+    def get_ordering(self):
+        """
+        Return the ordering asked for, else by name.
+
+        Names are unique per user, so they break ties in the number of
+        recipes and the order can be read from the indexes.
+        """
+        ordering = self.request.query_params.get('ordering')
+        if not ordering or self.action != 'list':
+            return self.ordering
+
+        choices = [
+            f'{prefix}{field}'
+            for field in self.ordering_fields for prefix in ('', '-')
+        ]
+        if ordering not in choices:
+            raise ValidationError(
+                {'ordering': f'Must be one of: {", ".join(choices)}.'}
+            )
+        prefix = '-' if ordering.startswith('-') else ''
+        return tuple(dict.fromkeys((ordering, f'{prefix}name')))
+
+    def _autocomplete_limit(self):
+        """Return the number of suggestions asked for, within bounds."""
+        limit = self.request.query_params.get('limit')
+        if limit is None:
+            return settings.RECIPE_AUTOCOMPLETE_LIMIT
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+
+        return max(1, min(limit, settings.RECIPE_AUTOCOMPLETE_MAX_LIMIT))
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('q', OpenApiTypes.STR, description='Start of the name being typed.'),
+            OpenApiParameter('limit', OpenApiTypes.INT, description='Number of suggestions.'),
+        ]
+    )
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """
+        Suggest names completing `q`, best first.
+
+        Names starting with `q` come before names containing it or similar
+        to it. Only ids and names are returned, and suggestions are cached
+        briefly by the server and the client.
+        """
+        prefix = request.query_params.get('q', '').strip()
+        limit = self._autocomplete_limit()
+        timeout = settings.RECIPE_AUTOCOMPLETE_CACHE_TIMEOUT
+        data = []
+        if prefix:
+            data = get_or_set_user_data(
+                request.user.pk,
+                [self.basename, 'autocomplete', str(limit), prefix],
+                lambda: list(suggest_names(
+                    self.queryset.filter(user=request.user), prefix, limit
+                )),
+                timeout,
+            )
+
+        response = Response(data)
+        response['Cache-Control'] = f'private, max-age={timeout}'
+        patch_vary_headers(response, ('Authorization',))
+        return response
 
 class TagViewset(BaseRecipeAttrViewSet):
     """View manage tags in the database."""
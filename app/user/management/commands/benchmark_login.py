@@ -0,0 +1,58 @@
+"""
+Django command to benchmark logins through the token endpoint.
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.core.management import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from user.views import CreateTokenView
+
+
+class Command(BaseCommand):
+    """Django command to report logins per second for one worker."""
+    help = 'Benchmark /api/user/token/ with the configured password hasher.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--logins',
+            type=int,
+            default=20,
+            help='Number of logins to time.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint command for benchmarking logins"""
+        hasher = get_hasher()
+        self.stdout.write(f'Hasher: {hasher.algorithm}')
+        for key, value in hasher.safe_summary(hasher.encode(
+            'benchmark', hasher.salt()
+        )).items():
+            if key not in ('salt', 'hash'):
+                self.stdout.write(f'  {key}: {value}')
+
+        view = CreateTokenView.as_view()
+        factory = APIRequestFactory()
+        credentials = {
+            'email': 'benchmark-login@example.com',
+            'password': 'benchmark-password',
+        }
+
+        # Nothing the benchmark creates is kept.
+        with transaction.atomic():
+            get_user_model().objects.create_user(**credentials)
+            start = time.perf_counter()
+            for _ in range(options['logins']):
+                response = view(factory.post('/api/user/token/', credentials))
+                if response.status_code != 200:
+                    raise RuntimeError(f'Login failed: {response.data}')
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{options["logins"] / elapsed:.1f} logins/sec on one worker '
+            f'({elapsed / options["logins"] * 1000:.1f} ms per login)'
+        ))
@@ -1,7 +1,7 @@
 """
 Test for the user api endpoint
 """
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
@@ -104,6 +104,36 @@ class PublicUserApiTest(TestCase):
         self.assertNotIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_create_token_rehashes_on_cost_change(self):
+        """Test logging in upgrades a hash made with an old cost."""
+        user = create_user(email='test@example.com', password='mypasswords')
+        self.assertIn('$1000$', user.password)
+
+        payload = {'email': 'test@example.com', 'password': 'mypasswords'}
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_create_token_rehashes_on_hasher_change(self):
+        """Test logging in upgrades a hash to the preferred hasher."""
+        user = create_user(email='test@example.com', password='mypasswords')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+        payload = {'email': 'test@example.com', 'password': 'mypasswords'}
+        with self.settings(PASSWORD_HASHERS=[
+            'core.hashers.TunableArgon2PasswordHasher',
+            'core.hashers.TunablePBKDF2PasswordHasher',
+        ], PASSWORD_ARGON2_MEMORY_COST=1024, PASSWORD_ARGON2_PARALLELISM=1):
+            res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$'))
+
     def test_retrieve_user_unauthorized(self):
         """Test user is not authorized"""
 
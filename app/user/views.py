@@ -2,11 +2,13 @@
 View for the user api
 """
 
-from rest_framework import generics, authentication, permissions
+from django.contrib.auth import get_user_model
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
 
+from core.authentication import CachedTokenAuthentication
 from user.serializers import UserSerializer, AuthTokenSerializer
 
 class CreateUserView(generics.CreateAPIView):
@@ -21,9 +23,14 @@ class CreateTokenView(ObtainAuthToken):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user view."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        """Retrieves and returns the authenticated user."""
-        return self.request.user
+        """
+        Retrieves and returns the authenticated user.
+
+        The user is read afresh, as the one authenticated may be a cached
+        copy, and saving it would write its stale fields back.
+        """
+        return get_user_model().objects.get(pk=self.request.user.pk)
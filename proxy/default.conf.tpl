@@ -5,6 +5,11 @@ server {
         alias /vol/static;
     }
 
+    location /static/media/uploads/recipe/variants/ {
+        alias /vol/static/media/uploads/recipe/variants/;
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
     location / {
         uwsgi_pass              ${APP_HOST}:${APP_PORT};
         include                 /etc/nginx/uwsgi_params;
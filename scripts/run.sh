@@ -6,4 +6,12 @@ python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
-uwsgi --scoket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# Images queued in the memory of a worker are lost with it, so process
+# the ones left pending or processing every few minutes.
+while true; do
+    sleep ${STUCK_IMAGES_INTERVAL:-300}
+    python manage.py process_stuck_images || true
+done &
+
+uwsgi --socket :9000 --workers ${UWSGI_WORKERS:-4} --threads ${UWSGI_THREADS:-1} \
+    --master --enable-threads --module app.wsgi
\ No newline at end of file